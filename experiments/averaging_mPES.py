@@ -2,6 +2,8 @@ import argparse
 from subprocess import run
 
 from memristor_nengo.extras import *
+from figure_pipeline import FigurePipeline
+from run_catalog import register_run
 
 parser = argparse.ArgumentParser()
 parser.add_argument( "-a", "--averaging", type=int, required=True )
@@ -86,11 +88,14 @@ print( "Average MSE-to-rho:", mse_to_rho_means )
 
 res_list = range( num_averaging )
 
+# rendered in the background while the results are written
+figures = FigurePipeline()
+
 fig = plt.figure()
 ax = fig.add_subplot( 111 )
 ax.plot( res_list, res_mse, label="MSE" )
 ax.legend()
-fig.savefig( dir_images + "mse" + ".pdf" )
+figures.save( fig, dir_images + "mse" + ".pdf" )
 
 fig = plt.figure()
 ax = fig.add_subplot( 111 )
@@ -98,9 +103,8 @@ ax.plot( res_list, res_pearson, label="Pearson" )
 ax.plot( res_list, res_spearman, label="Spearman" )
 ax.plot( res_list, res_kendall, label="Kendall" )
 ax.legend()
-fig.savefig( dir_images + "correlations" + ".pdf" )
+figures.save( fig, dir_images + "correlations" + ".pdf" )
 
-print( f"Saved plots in {dir_images}" )
 
 np.savetxt( dir_data + "results.csv",
             np.stack( (res_mse, res_pearson, res_spearman, res_kendall), axis=1 ),
@@ -112,3 +116,13 @@ with open( dir_data + "parameters.txt", "w" ) as f:
     f.write( f"Dimensions: {dimensions}\n" )
     f.write( f"Number of runs for averaging: {num_averaging}\n" )
 print( f"Saved data in {dir_data}" )
+figures.wait()
+print( f"Saved plots in {dir_images}" )
+
+register_run( directory + "catalog.sqlite", __file__, directory=dir_name, config=vars( args ),
+              metrics={ "mse"       : mse_means,
+                        "pearson"   : pearson_means,
+                        "spearman"  : spearman_means,
+                        "kendall"   : kendall_means,
+                        "mse_to_rho": mse_to_rho_means },
+              artifacts={ "images": dir_images, "results": dir_data + "results.csv" } )
@@ -0,0 +1,59 @@
+import hashlib
+import importlib
+import json
+import os
+
+import numpy as np
+
+
+# Persistent cache of the per-block testing errors of the arms that do not depend on the memristor settings (PES and
+# NEF controls).  Entries are keyed by the SHA-256 of the exact model configuration together with the versions of the
+# libraries that produced them, so a change in either simply misses the cache.
+
+LIBRARIES = [ "numpy", "nengo", "nengo_dl", "tensorflow" ]
+
+
+def library_versions():
+    versions = { }
+    for name in LIBRARIES:
+        try:
+            versions[ name ] = importlib.import_module( name ).__version__
+        except ImportError:
+            versions[ name ] = None
+
+    return versions
+
+
+def cache_key( config ):
+    description = json.dumps( { "config": config, "versions": library_versions() }, sort_keys=True, default=str )
+
+    return hashlib.sha256( description.encode() ).hexdigest()
+
+
+class BaselineCache:
+    def __init__( self, directory ):
+        self.directory = directory
+        os.makedirs( directory, exist_ok=True )
+
+    def _path( self, key ):
+        return os.path.join( self.directory, key + ".npy" )
+
+    def __contains__( self, config ):
+        return os.path.exists( self._path( cache_key( config ) ) )
+
+    def load( self, config ):
+        path = self._path( cache_key( config ) )
+        if not os.path.exists( path ):
+            return None
+
+        return np.load( path )
+
+    def save( self, config, errors ):
+        key = cache_key( config )
+        # written under a temporary name first so that concurrent workers never read a partial file
+        temporary = self._path( key ) + f".{os.getpid()}.tmp"
+        with open( temporary, "wb" ) as f:
+            np.save( f, np.asarray( errors ) )
+        os.replace( temporary, self._path( key ) )
+        with open( os.path.join( self.directory, key + ".json" ), "w" ) as f:
+            json.dump( { "config": config, "versions": library_versions() }, f, indent=2, default=str )
@@ -0,0 +1,92 @@
+import numpy as np
+from scipy.stats import kendalltau, norm
+
+
+# MSE, Pearson, Spearman and Kendall (tau-b) correlations and the MSE-to-rho ratio of every output dimension of
+# (samples, dimensions) arrays.  The MSE, Pearson, Spearman and the ranking of both series are one vectorised pass over
+# all the dimensions: the average ranks give Spearman (Pearson of the ranks, as scipy.stats.spearmanr) and the dense
+# ranks give Kendall.  Kendall alone stays one call per dimension to scipy.stats.kendalltau, which counts the discordant
+# pairs in O(n log n) in compiled code (Knight's algorithm); counting them with NumPy over all the dimensions at once
+# was slower.
+# With subsample the metrics are estimated on one random sample from each of subsample equal blocks of the series, and
+# returned with confidence intervals (Fisher z transform with the Fieller et al. variances for the correlations).
+
+def _ranks( x ):
+    # dense (0-based) and average (1-based) ranks of every row of a (dimensions, samples) array, and the sorting order
+    rows, n = x.shape
+    order = np.argsort( x, axis=1 )
+    sorted_x = np.take_along_axis( x, order, axis=1 )
+    new_value = np.ones( x.shape, dtype=bool )
+    new_value[ :, 1: ] = sorted_x[ :, 1: ] != sorted_x[ :, :-1 ]
+    # the runs of equal values of all the rows, one after the other
+    run = np.cumsum( new_value.ravel() ) - 1
+    starts = np.flatnonzero( new_value.ravel() )
+    ends = np.append( starts[ 1: ], rows * n )
+    average = (starts + ends - 1) / 2 + 1 - starts // n * n
+    # runs counted from the first one of every row
+    dense = run.reshape( x.shape ) - run[ ::n, None ]
+
+    dense_ranks = np.empty( x.shape, dtype=np.int64 )
+    average_ranks = np.empty( x.shape )
+    np.put_along_axis( dense_ranks, order, dense, axis=1 )
+    np.put_along_axis( average_ranks, order, average[ run ].reshape( x.shape ), axis=1 )
+
+    return dense_ranks, average_ranks, order
+
+
+def _pearson( x, y ):
+    x = x - x.mean( axis=1, keepdims=True )
+    y = y - y.mean( axis=1, keepdims=True )
+
+    return np.sum( x * y, axis=1 ) / np.sqrt( np.sum( x**2, axis=1 ) * np.sum( y**2, axis=1 ) )
+
+
+def _kendall( x_dense, y_dense, y_order ):
+    # scipy counts the discordant pairs in compiled code after sorting by y and then by x, in O(n log n); it is given
+    # the dense ranks already in the order of y, so that its first sort only has to run over sorted integers
+    x_dense = np.take_along_axis( x_dense, y_order, axis=1 )
+    y_dense = np.take_along_axis( y_dense, y_order, axis=1 )
+
+    return np.array( [ kendalltau( x, y )[ 0 ] for x, y in zip( x_dense, y_dense ) ] )
+
+
+def mse_to_rho_ratio( mse, rho ):
+    return np.asarray( rho ) / np.asarray( mse )
+
+
+def correlation_metrics( y_true, y_pred, subsample=None, seed=None, confidence=0.95 ):
+    # { metric: one value per dimension }, with "intervals": { metric: (low, high) } when subsampled
+    y_true = np.asarray( y_true, dtype=float ).reshape( len( y_true ), -1 )
+    y_pred = np.asarray( y_pred, dtype=float ).reshape( len( y_pred ), -1 )
+    n = y_true.shape[ 0 ]
+    if subsample is not None and subsample < n:
+        # one sample from each of subsample equal blocks of the series
+        edges = np.linspace( 0, n, subsample + 1 ).astype( int )
+        rng = np.random.RandomState( seed )
+        samples = edges[ :-1 ] + (rng.random_sample( subsample ) * np.diff( edges )).astype( int )
+        y_true, y_pred = y_true[ samples ], y_pred[ samples ]
+    m = y_true.shape[ 0 ]
+
+    squared_errors = (y_true - y_pred)**2
+    # one row per dimension, so that every sort runs over contiguous memory
+    y_true, y_pred = np.ascontiguousarray( y_true.T ), np.ascontiguousarray( y_pred.T )
+    x_dense, x_average, _ = _ranks( y_true )
+    y_dense, y_average, y_order = _ranks( y_pred )
+    metrics = { "mse"     : squared_errors.mean( axis=0 ),
+                "pearson" : _pearson( y_true, y_pred ),
+                "spearman": _pearson( x_average, y_average ),
+                "kendall" : _kendall( x_dense, y_dense, y_order ) }
+    metrics[ "mse_to_rho" ] = mse_to_rho_ratio( metrics[ "mse" ], metrics[ "spearman" ] )
+
+    if m < n:
+        z = norm.ppf( (1 + confidence) / 2 )
+        mse_error = z * squared_errors.std( axis=0 ) / np.sqrt( m )
+        intervals = { "mse": (metrics[ "mse" ] - mse_error, metrics[ "mse" ] + mse_error) }
+        for name, variance in [ ("pearson", 1 / (m - 3)), ("spearman", 1.06 / (m - 3)), ("kendall", 0.437 / (m - 4)) ]:
+            fisher = np.arctanh( np.clip( metrics[ name ], -1 + 1e-12, 1 - 1e-12 ) )
+            error = z * np.sqrt( variance )
+            intervals[ name ] = (np.tanh( fisher - error ), np.tanh( fisher + error ))
+        metrics[ "intervals" ] = intervals
+
+    return metrics
+
@@ -0,0 +1,68 @@
+import json
+
+import numpy as np
+import zarr
+from numcodecs import Blosc
+
+
+# Binary export of the data of a run, replacing the CSV dumps of the probes and memristors: every array is a chunked
+# column of a Zarr group, compressed with Blosc/LZ4 and written chunk by chunk so that memory-mapped or streamed probe
+# data is never loaded whole.  The group carries dt, sample_every, learn_time and the configuration of the run as
+# attributes and follows the xarray conventions, so it can be opened lazily with load_run() or xarray.open_zarr().
+# Sparse weight histories are stored as their events and keyframes and rebuilt when loaded.
+
+COMPRESSOR = Blosc( cname="lz4", clevel=5, shuffle=Blosc.BITSHUFFLE )
+
+
+def _write( group, name, data, dims, chunk_bytes ):
+    shape = tuple( data.shape )
+    # chunks of whole samples, about chunk_bytes each
+    chunk_rows = max( chunk_bytes // (data.dtype.itemsize * int( np.prod( shape[ 1: ] ) )), 1 )
+    out = group.create_dataset( name, shape=shape, chunks=(chunk_rows,) + shape[ 1: ], dtype=data.dtype,
+                                compressor=COMPRESSOR, fill_value=None, overwrite=True )
+    for start in range( 0, shape[ 0 ], chunk_rows ):
+        out[ start:start + chunk_rows ] = np.asarray( data[ start:start + chunk_rows ] )
+    out.attrs[ "_ARRAY_DIMENSIONS" ] = dims
+
+
+def export_run( path, time, arrays, histories=None, attrs=None, chunk_bytes=2**22 ):
+    # time: the sample times, arrays: { name: (samples, ...) array }, histories: { name: WeightHistory }
+    group = zarr.open_group( path, mode="w" )
+    # values that JSON cannot hold (e.g. nengo's Default) are stored as their string
+    group.attrs.update( json.loads( json.dumps( attrs or { }, default=str ) ) )
+    _write( group, "time", np.asarray( time ), [ "time" ], chunk_bytes )
+    for name, data in arrays.items():
+        data = data if hasattr( data, "dtype" ) else np.asarray( data )
+        _write( group, name, data, [ "time" ] + [ f"{name}_{i}" for i in range( 1, data.ndim ) ], chunk_bytes )
+    for name, history in (histories or { }).items():
+        subgroup = group.create_group( name )
+        subgroup.attrs[ "weight_history" ] = True
+        for key, value in history.state().items():
+            subgroup.create_dataset( key, data=value, compressor=COMPRESSOR )
+    zarr.consolidate_metadata( group.store )
+
+    return path
+
+
+def load_run( path ):
+    # attributes and lazy arrays of an exported run; only the chunks that are indexed are read and decompressed
+    from weight_history import WeightHistory
+
+    group = zarr.open_consolidated( path, mode="r" )
+    data = { }
+    for name, item in group.items():
+        if isinstance( item, zarr.hierarchy.Group ) and item.attrs.get( "weight_history" ):
+            history = WeightHistory( item[ "shape" ][ ... ] )
+            history.load_state( { key: item[ key ][ ... ] for key in item.array_keys() } )
+            data[ name ] = history
+        else:
+            data[ name ] = item
+
+    return dict( group.attrs ), data
+
+
+def open_run( path, chunks="auto" ):
+    # the dense arrays of an exported run as a lazy xarray.Dataset
+    import xarray as xr
+
+    return xr.open_zarr( path, chunks=chunks )
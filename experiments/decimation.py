@@ -0,0 +1,43 @@
+import numpy as np
+
+
+# Downsampling of long probe series before they are plotted, so that drawing takes time proportional to the size of
+# the figure rather than to the length of the simulation.  Line plots keep the minimum and the maximum of every
+# channel in each of budget / 2 buckets (a min/max envelope, which looks the same as the full series once rasterised);
+# all the series of a figure share one set of sample indices so that they keep a common time axis.  Smoothed series
+# and sequences of weight matrices are instead taken at a uniform stride, which preserves their time scale.
+
+def stride( n, budget ):
+    # the step that leaves at most budget of n samples
+    return max( int( np.ceil( n / budget ) ), 1 )
+
+
+def envelope_indices( arrays, budget ):
+    # sorted indices of the samples at the minimum and maximum of every channel of every array in each bucket
+    data = np.concatenate( [ np.asarray( a ).reshape( len( a ), -1 ) for a in arrays ], axis=1 )
+    n = data.shape[ 0 ]
+    if n <= budget:
+        return np.arange( n )
+    n_buckets = max( budget // 2, 1 )
+    size = int( np.ceil( n / n_buckets ) )
+    n_buckets = int( np.ceil( n / size ) )
+    blocks = np.pad( data, ((0, n_buckets * size - n), (0, 0)), mode="edge" ).reshape( n_buckets, size, -1 )
+    starts = np.arange( n_buckets )[ :, None ] * size
+    indices = np.concatenate( [ (starts + blocks.argmin( axis=1 )).ravel(), (starts + blocks.argmax( axis=1 )).ravel(),
+                                [ 0, n - 1 ] ] )
+
+    return np.unique( np.minimum( indices, n - 1 ) )
+
+
+def decimate( time, arrays, budget, envelope=True ):
+    # time and arrays reduced to about budget samples per line
+    n = len( time )
+    if budget is None or n <= budget:
+        return time, arrays, 1
+    if envelope:
+        indices = envelope_indices( arrays, budget )
+
+        return time[ indices ], [ np.asarray( a[ indices ] ) for a in arrays ], 1
+    step = stride( n, budget )
+
+    return time[ ::step ], [ np.asarray( a[ ::step ] ) for a in arrays ], step
@@ -0,0 +1,70 @@
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+
+
+# Saving of matplotlib figures in background processes, so that rendering PDFs at 300 dpi does not hold up the next run
+# or the end of a script.  Every figure is pickled and handed to a fresh interpreter running this file, which renders
+# and saves it with the Agg backend; at most `workers` of them run at once.  Fresh interpreters rather than a
+# multiprocessing pool are used because the experiment scripts have no __main__ guard (spawned workers would re-run
+# them) and fork is unsafe once TensorFlow has started its threads.
+# wait() (or leaving the with block) blocks until every figure is written and raises if any of them failed.
+
+class FigurePipeline:
+    def __init__( self, workers=2 ):
+        # with workers=0 figures are saved straight away in this process
+        self.workers = workers
+        self.running = [ ]
+        self.failed = [ ]
+
+    def save( self, fig, path, close=True, **savefig_kwargs ):
+        if self.workers == 0:
+            fig.savefig( path, **savefig_kwargs )
+        else:
+            # an older version of the same file must not overwrite this one
+            for job in [ job for job in self.running if job[ 0 ] == path ]:
+                self._reap( job )
+            while len( self.running ) >= self.workers:
+                self._reap( self.running[ 0 ] )
+            with tempfile.NamedTemporaryFile( suffix=".pickle", delete=False ) as f:
+                pickle.dump( fig, f )
+            self.running.append( (path, subprocess.Popen( [ sys.executable, os.path.abspath( __file__ ), f.name, path,
+                                                            json.dumps( savefig_kwargs ) ] )) )
+        if close:
+            import matplotlib.pyplot as plt
+
+            plt.close( fig )
+
+    def _reap( self, job ):
+        path, process = job
+        if process.wait() != 0:
+            self.failed.append( path )
+        self.running.remove( job )
+
+    def wait( self ):
+        while self.running:
+            self._reap( self.running[ 0 ] )
+        if self.failed:
+            failed, self.failed = self.failed, [ ]
+            raise RuntimeError( f"Could not save {', '.join( failed )}" )
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, *exc ):
+        self.wait()
+
+
+if __name__ == "__main__":
+    import matplotlib
+
+    matplotlib.use( "Agg" )
+
+    figure_path, path, savefig_kwargs = sys.argv[ 1: ]
+    with open( figure_path, "rb" ) as f:
+        fig = pickle.load( f )
+    os.remove( figure_path )
+    fig.savefig( path, **json.loads( savefig_kwargs ) )
@@ -0,0 +1,364 @@
+import nengo
+import nengo_dl
+import numpy as np
+from nengo.learning_rules import PES
+from nengo.processes import PresentInput, WhiteSignal
+
+from baseline_cache import BaselineCache
+from learning_rules import mPES
+
+
+# Models and per-arm runner for learn_multidimensional_functions.py.
+# Everything a run needs is described by a plain dictionary so that the arms can be sent to the worker processes of a
+# pool, each worker simulating on the device it was pinned to when it started.
+
+ARMS = [ "mpes", "pes", "nef" ]
+ARM_NAMES = { "mpes": "Learning network (mPES)", "pes": "Control network (PES)", "nef": "Control network (NEF)" }
+# arms whose results do not depend on the memristors and can be reused across runs
+CACHED_ARMS = [ "pes", "nef" ]
+# to be increased whenever a change to the models invalidates the cached baselines
+MODEL_VERSION = 2
+# discrete running sum, y[ n ] = y[ n - 1 ] + x[ n ]
+RUNNING_SUM = nengo.LinearFilter( [ 1, 0 ], [ 1, -1 ], analog=False )
+
+_device = None
+_simulators = { }
+
+
+def circular_convolution( x, dimensions ):
+    # circular convolution of the two halves of the last axis
+    a = x[ ..., :int( dimensions / 2 ) ]
+    b = x[ ..., int( dimensions / 2 ): ]
+
+    return np.real( np.fft.ifft( np.fft.fft( a, axis=-1 ) * np.fft.fft( b, axis=-1 ), axis=-1 ) )
+
+
+def experiment_setup( experiment ):
+    if experiment == 1:
+        return {
+                "exp_string"       : "PRODUCT experiment",
+                "exp_name"         : "Multiplying two numbers",
+                "function_to_learn": lambda x: x[ 0 ] * x[ 1 ],
+                # vectorised over the leading axes, used to compute the target without neurons
+                "target"           : lambda x: x[ ..., 0:1 ] * x[ ..., 1:2 ],
+                # [ pre, post, ground_truth, error ]
+                "neurons"          : [ 200, 200, 100, 100 ],
+                "dimensions"       : [ 2, 1, 1, 1 ],
+                "sim_time"         : 50,
+                "img_name"         : "product"
+                }
+    if experiment == 2:
+        return {
+                "exp_string"       : "COMBINED PRODUCTS experiment",
+                "exp_name"         : "Combining two products",
+                "function_to_learn": lambda x: x[ 0 ] * x[ 1 ] + x[ 2 ] * x[ 3 ],
+                "target"           : lambda x: x[ ..., 0:1 ] * x[ ..., 1:2 ] + x[ ..., 2:3 ] * x[ ..., 3:4 ],
+                # [ pre, post, ground_truth, error ]
+                "neurons"          : [ 400, 400, 100, 100 ],
+                "dimensions"       : [ 4, 1, 1, 1 ],
+                "sim_time"         : 100,
+                "img_name"         : "combined_products"
+                }
+    if experiment == 3:
+        return {
+                "exp_string"       : "SEPARATE PRODUCTS experiment",
+                "exp_name"         : "Three separate products",
+                "function_to_learn": lambda x: [ x[ 0 ] * x[ 1 ], x[ 0 ] * x[ 2 ], x[ 1 ] * x[ 2 ] ],
+                "target"           : lambda x: np.stack( (x[ ..., 0 ] * x[ ..., 1 ], x[ ..., 0 ] * x[ ..., 2 ],
+                                                          x[ ..., 1 ] * x[ ..., 2 ]), axis=-1 ),
+                # [ pre, post, ground_truth, error ]
+                "neurons"          : [ 300, 300, 300, 300 ],
+                "dimensions"       : [ 3, 3, 3, 3 ],
+                "sim_time"         : 100,
+                "img_name"         : "separate_products"
+                }
+    if experiment == 4:
+        dimensions = [ 4, 2, 2, 2, 2 ]
+        return {
+                "exp_string"       : "2D CIRCULAR CONVOLUTIONS experiment",
+                "exp_name"         : "Two-dimensional circular convolution",
+                "function_to_learn": lambda x: np.fft.ifft(
+                        np.fft.fft( x[ :int( dimensions[ 0 ] / 2 ) ] ) * np.fft.fft( x[ int( dimensions[ 0 ] / 2 ): ] )
+                        ),
+                "target"           : lambda x: circular_convolution( x, dimensions[ 0 ] ),
+                # [ pre, post, ground_truth, error,conv ]
+                "neurons"          : [ 400, 400, 200, 200, 200 ],
+                "dimensions"       : dimensions,
+                "sim_time"         : 200,
+                "img_name"         : "2d_cconv"
+                }
+    if experiment == 5:
+        dimensions = [ 6, 3, 3, 3, 3 ]
+        return {
+                "exp_string"       : "3D CIRCULAR CONVOLUTIONS experiment",
+                "exp_name"         : "Three-dimensional circular convolution",
+                "function_to_learn": lambda x: np.fft.ifft(
+                        np.fft.fft( x[ :int( dimensions[ 0 ] / 2 ) ] ) * np.fft.fft( x[ int( dimensions[ 0 ] / 2 ): ] )
+                        ),
+                "target"           : lambda x: circular_convolution( x, dimensions[ 0 ] ),
+                # [ pre, post, ground_truth, error,conv ]
+                "neurons"          : [ 600, 300, 300, 300, 300 ],
+                "dimensions"       : dimensions,
+                "sim_time"         : 400,
+                "img_name"         : "3d_cconv"
+                }
+
+    raise ValueError( f"Unknown experiment {experiment}" )
+
+
+def learning_rule( arm, gain ):
+    if arm == "mpes":
+        return mPES( gain=gain )
+    if arm == "pes":
+        return PES()
+    if arm == "nef":
+        return None
+
+    raise ValueError( f"Unknown arm {arm}" )
+
+
+def _front_end( model, neurons, dimensions, function_to_learn, convolve, seed, sim_time, ground_truth="ensemble",
+                target=None, dt=0.001 ):
+    # ground_truth: "ensemble" represents the target with neurons (and the convolution network for experiments 4-5),
+    # "node" computes it from the input with the vectorised target function and "trace" plays back a target
+    # precomputed from the whole input signal
+    model.inp = nengo.Node(
+            # WhiteNoise( dist=Gaussian( 0, 0.05 ), seed=seed ),
+            WhiteSignal( sim_time, high=5, seed=seed ),
+            size_out=dimensions[ 0 ]
+            )
+    model.pre = nengo.Ensemble( neurons[ 0 ], dimensions=dimensions[ 0 ], seed=seed )
+
+    nengo.Connection( model.inp, model.pre )
+
+    if ground_truth == "node":
+        model.ground_truth = nengo.Node( lambda t, x: target( x ), size_in=dimensions[ 0 ],
+                                         size_out=dimensions[ 2 ] )
+        nengo.Connection( model.inp, model.ground_truth, synapse=None )
+        return
+    if ground_truth == "trace":
+        n_steps = int( np.ceil( sim_time / dt ) )
+        model.ground_truth = nengo.Node(
+                PresentInput( target( model.inp.output.run_steps( n_steps, d=dimensions[ 0 ], dt=dt ) ),
+                              presentation_time=dt ) )
+        return
+
+    model.ground_truth = nengo.Ensemble( neurons[ 2 ], dimensions=dimensions[ 2 ], seed=seed )
+    if convolve:
+        model.conv = nengo.networks.CircularConvolution( neurons[ 4 ], dimensions[ 4 ], seed=seed )
+        nengo.Connection( model.inp[ :int( dimensions[ 0 ] / 2 ) ],
+                          model.conv.input_a,
+                          synapse=None )
+        nengo.Connection( model.inp[ int( dimensions[ 0 ] / 2 ): ],
+                          model.conv.input_b,
+                          synapse=None )
+        nengo.Connection( model.conv.output, model.ground_truth,
+                          synapse=None )
+    else:
+        nengo.Connection( model.inp, model.ground_truth,
+                          function=function_to_learn,
+                          synapse=None )
+
+
+def _arm( arm, front_end, neurons, dimensions, learning_rule, function_to_learn, seed, learn_block_time, decoded ):
+    # post population, error population and learned connection reading from the pre population of the front end
+    rng = np.random.RandomState( seed )
+
+    arm.post = nengo.Ensemble( neurons[ 1 ], dimensions=dimensions[ 1 ], seed=seed )
+
+    if learning_rule:
+        arm.error = nengo.Ensemble( neurons[ 3 ], dimensions=dimensions[ 3 ], seed=seed )
+
+        if isinstance( learning_rule, mPES ) or (isinstance( learning_rule, PES ) and not decoded):
+            arm.conn = nengo.Connection(
+                    front_end.pre.neurons,
+                    arm.post.neurons,
+                    transform=rng.random_sample(
+                            (arm.post.n_neurons, front_end.pre.n_neurons)
+                            ),
+                    learning_rule_type=learning_rule
+                    )
+        else:
+            arm.conn = nengo.Connection(
+                    front_end.pre,
+                    arm.post,
+                    function=lambda x: rng.random_sample( dimensions[ 1 ] ),
+                    learning_rule_type=learning_rule
+                    )
+        nengo.Connection( arm.error, arm.conn.learning_rule )
+        nengo.Connection( arm.post, arm.error )
+        nengo.Connection( front_end.ground_truth, arm.error, transform=-1 )
+
+        class cyclic_inhibit:
+            def __init__( self, cycle_time ):
+                self.out_inhibit = 0.0
+                self.cycle_time = cycle_time
+
+            def step( self, t ):
+                if t % self.cycle_time == 0:
+                    if self.out_inhibit == 0.0:
+                        self.out_inhibit = 2.0
+                    else:
+                        self.out_inhibit = 0.0
+
+                return self.out_inhibit
+
+        arm.inhibitor = cyclic_inhibit( learn_block_time )
+        arm.inhib = nengo.Node( arm.inhibitor.step )
+        nengo.Connection( arm.inhib, arm.error.neurons,
+                          transform=[ [ -1 ] ] * arm.error.n_neurons )
+    else:
+        arm.conn = nengo.Connection(
+                front_end.pre,
+                arm.post,
+                function=function_to_learn
+                )
+
+    # the filtered difference between post and ground truth is accumulated inside the simulation and only sampled at
+    # the end of every block; it is built from plain Nengo objects rather than a Python Node, so that NengoDL runs it in
+    # the TensorFlow graph: rectified linear neurons with encoders +-e_i, unit gain and no bias output the absolute
+    # error of every dimension and their sum is integrated by a discrete running sum (reset with the simulator)
+    d = dimensions[ 1 ]
+    arm.error_magnitude = nengo.Ensemble( 2 * d, dimensions=d, neuron_type=nengo.RectifiedLinear(),
+                                          encoders=np.vstack( [ np.eye( d ), -np.eye( d ) ] ), gain=np.ones( 2 * d ),
+                                          bias=np.zeros( 2 * d ), seed=seed )
+    nengo.Connection( arm.post, arm.error_magnitude, synapse=0.01 )
+    nengo.Connection( front_end.ground_truth, arm.error_magnitude, transform=-1, synapse=0.01 )
+    arm.block_error = nengo.Node( size_in=1 )
+    nengo.Connection( arm.error_magnitude.neurons, arm.block_error, transform=np.ones( (1, 2 * d) ),
+                      synapse=RUNNING_SUM )
+    arm.block_error_probe = nengo.Probe( arm.block_error, sample_every=learn_block_time )
+
+
+def LearningModel( neurons, dimensions, learning_rule, function_to_learn, convolve, seed, sim_time, learn_block_time,
+                   decoded=True, ground_truth="ensemble", target=None ):
+    with nengo.Network() as model:
+
+        nengo_dl.configure_settings( stateful=False )
+
+        _front_end( model, neurons, dimensions, function_to_learn, convolve, seed, sim_time, ground_truth=ground_truth,
+                    target=target )
+        _arm( model, model, neurons, dimensions, learning_rule, function_to_learn, seed, learn_block_time, decoded )
+
+    return model
+
+
+def MultiArmModel( neurons, dimensions, learning_rules, function_to_learn, convolve, seed, sim_time, learn_block_time,
+                   decoded=True, ground_truth="ensemble", target=None ):
+    # a single input, pre and ground truth front end shared by one post/error/learning rule arm per learning rule;
+    # every arm is built exactly as in LearningModel, so each sees the same network it would see on its own
+    with nengo.Network() as model:
+
+        nengo_dl.configure_settings( stateful=False )
+
+        _front_end( model, neurons, dimensions, function_to_learn, convolve, seed, sim_time, ground_truth=ground_truth,
+                    target=target )
+        model.arms = { }
+        for name, rule in learning_rules.items():
+            with nengo.Network( label=name ) as arm:
+                _arm( arm, model, neurons, dimensions, rule, function_to_learn, seed, learn_block_time, decoded )
+            model.arms[ name ] = arm
+
+    return model
+
+
+def testing_errors( sim, block_error_probe ):
+    # the probe holds the running total at the end of every block, testing blocks are the even ones
+    total_error = np.diff( np.squeeze( sim.data[ block_error_probe ], axis=1 ), prepend=0 )
+
+    return total_error[ 0::2 ]
+
+
+def pin_device( devices ):
+    # pool initializer: every worker takes the next device from the shared queue
+    global _device
+    _device = devices.get()
+
+
+def baseline_config( job, setup, arm ):
+    # everything the testing errors of a control arm depend on
+    config = { "model_version"   : MODEL_VERSION,
+               "experiment"      : job[ "experiment" ],
+               "arm"             : arm,
+               "neurons"         : setup[ "neurons" ],
+               "dimensions"      : setup[ "dimensions" ],
+               "seed"            : job[ "seed" ],
+               "sim_time"        : job[ "sim_time" ],
+               "learn_block_time": job[ "learn_block_time" ],
+               "ground_truth"    : job[ "ground_truth" ] }
+    if arm == "pes":
+        config[ "decoded" ] = job[ "decoded" ]
+
+    return config
+
+
+def _simulate( job, setup, arms, device ):
+    convolve = job[ "experiment" ] > 3
+
+    def build( seed ):
+        if len( arms ) == 1:
+            return LearningModel( setup[ "neurons" ], setup[ "dimensions" ], learning_rule( arms[ 0 ], job[ "gain" ] ),
+                                  setup[ "function_to_learn" ], convolve=convolve, seed=seed,
+                                  sim_time=job[ "sim_time" ], learn_block_time=job[ "learn_block_time" ],
+                                  decoded=job[ "decoded" ], ground_truth=job[ "ground_truth" ],
+                                  target=setup[ "target" ] )
+        return MultiArmModel( setup[ "neurons" ], setup[ "dimensions" ],
+                              { arm: learning_rule( arm, job[ "gain" ] ) for arm in arms },
+                              setup[ "function_to_learn" ], convolve=convolve, seed=seed, sim_time=job[ "sim_time" ],
+                              learn_block_time=job[ "learn_block_time" ], decoded=job[ "decoded" ],
+                              ground_truth=job[ "ground_truth" ], target=setup[ "target" ] )
+
+    def arm_networks( model ):
+        return [ model ] if len( arms ) == 1 else [ model.arms[ arm ] for arm in arms ]
+
+    print( ", ".join( ARM_NAMES[ arm ] for arm in arms ), "seed", job[ "seed" ], "on", device )
+    if job[ "reseed" ]:
+        from reseeding import ReseedableSimulator
+
+        # one simulator per arm is kept alive in each process and re-seeded for the following iterations
+        key = (job[ "experiment" ], tuple( arms ), job[ "sim_time" ], job[ "gain" ], job[ "decoded" ],
+               job[ "ground_truth" ], device)
+        if key not in _simulators:
+            _simulators[ key ] = ReseedableSimulator( build, job[ "seed" ], device=device )
+        reseedable = _simulators[ key ]
+        model = reseedable.reseed( job[ "seed" ] )
+        for arm in arm_networks( model ):
+            if hasattr( arm, "inhibitor" ):
+                arm.inhibitor.out_inhibit = 0.0
+        reseedable.run( job[ "sim_time" ] )
+        sim = reseedable.sim
+    else:
+        model = build( job[ "seed" ] )
+        with nengo_dl.Simulator( model, device=device ) as sim:
+            sim.run( job[ "sim_time" ] )
+
+    return { arm: testing_errors( sim, network.block_error_probe )
+             for arm, network in zip( arms, arm_networks( model ) ) }
+
+
+def run_arm( job ):
+    # job: experiment, arms, seed, sim_time, learn_block_time, gain, decoded, ground_truth, reseed, cache, device
+    # with several arms they share one front end and one simulator, the testing errors are returned in arm order
+    device = _device if _device is not None else job[ "device" ]
+    setup = experiment_setup( job[ "experiment" ] )
+
+    errors = { }
+    cache = BaselineCache( job[ "cache" ] ) if job[ "cache" ] else None
+    if cache is not None:
+        for arm in job[ "arms" ]:
+            if arm in CACHED_ARMS:
+                cached = cache.load( baseline_config( job, setup, arm ) )
+                if cached is not None:
+                    print( ARM_NAMES[ arm ], "seed", job[ "seed" ], "loaded from the cache" )
+                    errors[ arm ] = cached
+
+    arms = [ arm for arm in job[ "arms" ] if arm not in errors ]
+    if arms:
+        simulated = _simulate( job, setup, arms, device )
+        if cache is not None:
+            for arm in arms:
+                if arm in CACHED_ARMS:
+                    cache.save( baseline_config( job, setup, arm ), simulated[ arm ] )
+        errors.update( simulated )
+
+    return [ errors[ arm ] for arm in job[ "arms" ] ]
@@ -0,0 +1,58 @@
+import nengo
+import numpy as np
+
+from memristor_arrays import OnedirectionalPowerlawMemristorArray
+
+
+# Estimate the conductance-to-weight gain of mPES before running a long simulation.
+# The gain has to map the change in normalised conductance that a synapse can accumulate over a short adaptation
+# window onto the magnitude of the weights the network has to learn.  The target weights are the full NEF weights
+# (post scaled encoders times pre decoders) for the function to learn and the change in conductance is measured on
+# simulated devices drawn from the same R_0, R_1, exponent distribution used by mPES, pulsed as many times as the pre
+# neurons spike during the window in a short probe run.
+
+def ideal_weights( pre_n_neurons, post_n_neurons, dimensions, function, input_function, probe_time=1.0, seed=None,
+                   dt=0.001 ):
+    with nengo.Network( seed=seed ) as model:
+        input_node = nengo.Node( output=input_function, size_out=dimensions )
+        pre = nengo.Ensemble( pre_n_neurons, dimensions=dimensions, seed=seed )
+        post = nengo.Ensemble( post_n_neurons, dimensions=dimensions, seed=seed )
+        nengo.Connection( input_node, pre )
+        conn = nengo.Connection( pre, post, function=function, solver=nengo.solvers.LstsqL2( weights=True ) )
+        spikes_probe = nengo.Probe( pre.neurons )
+
+    with nengo.Simulator( model, seed=seed, dt=dt, progress_bar=False ) as sim:
+        sim.run( probe_time )
+
+    weights = sim.data[ conn ].weights
+    rates = np.sum( sim.data[ spikes_probe ] > 0, axis=0 ) / probe_time
+
+    return weights, rates
+
+
+def conductance_change( pulses, r_min=2e2, r_max=2.3e8, exponent=-0.146, noise=0.15, r_init=(1e8, 1.1e8),
+                        samples=100, seed=None ):
+    # normalised conductance gained by each device after the given number of SET pulses
+    pulses = np.rint( np.atleast_1d( pulses ) ).astype( int )
+    memristors = OnedirectionalPowerlawMemristorArray( (samples, len( pulses )), a=exponent, r_0=r_min, r_1=r_max,
+                                                       noise=noise, r_init=r_init, seed=seed )
+    g_start = memristors.normalised_conductance()
+    for step in range( np.amax( pulses, initial=0 ) ):
+        memristors.pulse( 1e-1, mask=np.broadcast_to( step < pulses, memristors.shape ) )
+
+    return memristors.normalised_conductance() - g_start
+
+
+def calibrate_gain( pre_n_neurons, post_n_neurons, dimensions, function, input_function, window=1.0,
+                    probe_time=1.0, r_min=2e2, r_max=2.3e8, exponent=-0.146, noise=0.15, seed=None, dt=0.001 ):
+    weights, rates = ideal_weights( pre_n_neurons, post_n_neurons, dimensions, function, input_function,
+                                    probe_time=probe_time, seed=seed, dt=dt )
+    delta_g = conductance_change( rates * window, r_min=r_min, r_max=r_max, exponent=exponent, noise=noise,
+                                  seed=seed )
+
+    # only pre neurons that fire can have their synapses updated
+    active = rates > 0
+    target = np.median( np.abs( weights[ :, active ] ) )
+    reachable = np.median( np.abs( delta_g[ :, active ] ) )
+
+    return target / reachable
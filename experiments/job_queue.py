@@ -0,0 +1,174 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+# File-backed job queue for running sweeps on several machines that share a filesystem.
+# Jobs are claimed atomically inside an IMMEDIATE transaction, running jobs send heartbeats and jobs whose worker
+# stopped sending heartbeats (e.g. because the host crashed) are put back in the queue until they run out of attempts.
+# The default rollback journal is used because WAL mode does not work on network filesystems.
+
+class JobQueue:
+    def __init__( self, path, heartbeat_timeout=300, max_attempts=3 ):
+        self.path = path
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+
+        with self._connect() as connection:
+            connection.execute( "CREATE TABLE IF NOT EXISTS jobs ("
+                                "id INTEGER PRIMARY KEY, "
+                                "payload TEXT NOT NULL, "
+                                "status TEXT NOT NULL DEFAULT 'pending', "
+                                "attempts INTEGER NOT NULL DEFAULT 0, "
+                                "worker TEXT, "
+                                "heartbeat REAL, "
+                                "result TEXT, "
+                                "error TEXT )" )
+            connection.execute( "CREATE INDEX IF NOT EXISTS jobs_status ON jobs ( status )" )
+            connection.execute( "CREATE TABLE IF NOT EXISTS meta ( key TEXT PRIMARY KEY, value TEXT )" )
+
+    def _connect( self ):
+        connection = sqlite3.connect( self.path, timeout=60, isolation_level=None )
+        connection.execute( "PRAGMA busy_timeout = 60000" )
+
+        return _Transaction( connection )
+
+    def set_meta( self, key, value ):
+        with self._connect() as connection:
+            connection.execute( "INSERT OR REPLACE INTO meta VALUES ( ?, ? )", (key, json.dumps( value )) )
+
+    def get_meta( self, key ):
+        with self._connect() as connection:
+            row = connection.execute( "SELECT value FROM meta WHERE key = ?", (key,) ).fetchone()
+
+        return json.loads( row[ 0 ] ) if row is not None else None
+
+    def enqueue( self, payloads ):
+        with self._connect() as connection:
+            connection.executemany( "INSERT INTO jobs ( payload ) VALUES ( ? )",
+                                    [ (json.dumps( p ),) for p in payloads ] )
+
+    def _requeue_stale( self, connection, now ):
+        connection.execute( "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                            "error = 'heartbeat lost on ' || worker "
+                            "WHERE status = 'running' AND heartbeat < ?",
+                            (self.max_attempts, now - self.heartbeat_timeout) )
+
+    def claim( self, worker ):
+        now = time.time()
+        with self._connect() as connection:
+            self._requeue_stale( connection, now )
+            row = connection.execute( "SELECT id, payload FROM jobs WHERE status = 'pending' "
+                                      "ORDER BY id LIMIT 1" ).fetchone()
+            if row is None:
+                return None
+            connection.execute( "UPDATE jobs SET status = 'running', worker = ?, heartbeat = ?, "
+                                "attempts = attempts + 1 WHERE id = ?",
+                                (worker, now, row[ 0 ]) )
+
+        return row[ 0 ], json.loads( row[ 1 ] )
+
+    def heartbeat( self, job_id, worker ):
+        with self._connect() as connection:
+            connection.execute( "UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                                (time.time(), job_id, worker) )
+
+    def complete( self, job_id, worker, result ):
+        with self._connect() as connection:
+            connection.execute( "UPDATE jobs SET status = 'done', result = ?, error = NULL "
+                                "WHERE id = ? AND worker = ? AND status = 'running'",
+                                (json.dumps( result ), job_id, worker) )
+
+    def fail( self, job_id, worker, error ):
+        with self._connect() as connection:
+            connection.execute( "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                                "error = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                                (self.max_attempts, str( error ), job_id, worker) )
+
+    def counts( self ):
+        with self._connect() as connection:
+            self._requeue_stale( connection, time.time() )
+            rows = connection.execute( "SELECT status, COUNT(*) FROM jobs GROUP BY status" ).fetchall()
+
+        return dict( rows )
+
+    def results( self ):
+        with self._connect() as connection:
+            rows = connection.execute( "SELECT payload, result FROM jobs WHERE status = 'done' "
+                                       "ORDER BY id" ).fetchall()
+
+        return [ (json.loads( p ), json.loads( r )) for p, r in rows ]
+
+
+class _Transaction:
+    # BEGIN IMMEDIATE takes the write lock straight away so that two workers can never claim the same job
+    def __init__( self, connection ):
+        self.connection = connection
+
+    def __enter__( self ):
+        self.connection.execute( "BEGIN IMMEDIATE" )
+
+        return self.connection
+
+    def __exit__( self, exc_type, exc_value, traceback ):
+        if exc_type is None:
+            self.connection.execute( "COMMIT" )
+        else:
+            self.connection.execute( "ROLLBACK" )
+        self.connection.close()
+
+
+def gather_results( queue, shape, index ):
+    # the results (sequences of numbers) of the completed jobs in an array of the given shape, placed at index( job );
+    # the entries of the jobs that failed or have not finished yet stay NaN
+    data = np.full( shape, np.nan )
+    for job, result in queue.results():
+        data[ index( job ) ] = result
+
+    return data
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_worker( queue, function, heartbeat_interval=30, worker=None, poll=False, poll_interval=10 ):
+    # run jobs until the queue is drained, the heartbeat is sent from a background thread while the job is running
+    worker = worker if worker is not None else worker_name()
+    completed = 0
+    while True:
+        job = queue.claim( worker )
+        if job is None:
+            counts = queue.counts()
+            if poll and counts.get( "running", 0 ) > 0:
+                # jobs of crashed workers will come back once their heartbeat times out
+                time.sleep( poll_interval )
+                continue
+            return completed
+        job_id, payload = job
+
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait( heartbeat_interval ):
+                queue.heartbeat( job_id, worker )
+
+        heart = threading.Thread( target=beat, daemon=True )
+        heart.start()
+        try:
+            result = function( payload )
+        except Exception as e:
+            stop.set()
+            heart.join()
+            queue.fail( job_id, worker, repr( e ) )
+            print( f"[{worker}] Job {job_id} failed: {e!r}" )
+        else:
+            stop.set()
+            heart.join()
+            queue.complete( job_id, worker, result )
+            completed += 1
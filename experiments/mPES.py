@@ -1,15 +1,19 @@
 import argparse
 import os
+import tempfile
 import time
 
 import nengo_dl
 from nengo.learning_rules import PES
 from nengo.params import Default
 from nengo.processes import WhiteSignal
-from sklearn.metrics import mean_squared_error
 
 from memristor_nengo.extras import *
 from memristor_nengo.learning_rules import mPES
+from correlation_metrics import correlation_metrics, mse_to_rho_ratio
+from decimation import stride
+from figure_pipeline import FigurePipeline
+from run_catalog import register_run
 
 setup()
 
@@ -31,6 +35,9 @@ parser.add_argument( "-D", "--dimensions", default=3, type=int,
 parser.add_argument( "-n", "--noise", nargs="*", default=0.15, type=float,
                      help="The noise on the simulated memristors [R_0, R_1, c, R_init]  Default is 0.15" )
 parser.add_argument( "-g", "--gain", default=1e4, type=float )  # default chosen by parameter search experiments
+parser.add_argument( "-G", "--calibrate_gain", action="store_true",
+                     help="Estimate the gain from the ensembles and the memristors before simulating.  "
+                          "Overrides --gain" )
 parser.add_argument( "-l", "--learning_rule", default="mPES", choices=[ "mPES", "PES" ] )
 parser.add_argument( "-P", "--parameters", default=Default, type=float,
                      help="The parametrs of simualted memristors.  For now only the exponent c" )
@@ -48,10 +55,61 @@ parser.add_argument( "-d", "--device", default="/cpu:0",
 parser.add_argument( "-lt", "--learn_time", default=3 / 4, type=float )
 parser.add_argument( '--probe', default=1, choices=[ 0, 1, 2 ], type=int,
                      help="0: probing disabled, 1: only probes to calculate statistics, 2: all probes active" )
+parser.add_argument( "--metrics", default="offline", choices=[ "offline", "online" ],
+                     help="offline: statistics calculated from the probe data after the run, online: accumulated "
+                          "during the simulation without storing any probe data (Spearman and Kendall estimated on a "
+                          "sample of --metrics_sample points).  Default is offline" )
+parser.add_argument( "--metrics_sample", default=10000, type=int,
+                     help="Points sampled to estimate the online Spearman and Kendall correlations.  Default is 10000" )
+parser.add_argument( "--correlation_sample", default=None, type=int,
+                     help="Estimate the offline statistics on this many points (one from each of as many equal "
+                          "blocks of the series) and print their 95%% confidence intervals.  Default is all of them" )
+parser.add_argument( "--plots", default=None, nargs="*",
+                     choices=[ "results_smooth", "results", "post_spikes", "weights", "testing_smooth", "testing",
+                               "weights_mpes", "memristors" ],
+                     help="The plots generated with --plot >= 1.  Default is all of them" )
+parser.add_argument( "--plot_points", default=4000, type=int,
+                     help="Samples per line drawn in the plots; longer series are reduced to a min/max envelope (or a "
+                          "uniform stride when smoothed).  Default is 4000" )
+parser.add_argument( "--plot_frames", default=200, type=int,
+                     help="Weight matrices passed to the weight plots, taken at a uniform stride.  Default is 200" )
+parser.add_argument( "--figure_workers", default=2, type=int,
+                     help="Background processes saving the figures (0 saves them in the main process).  Default is 2" )
+parser.add_argument( "--checkpoint_every", default=None, type=float,
+                     help="Save the complete simulator state every this many simulated seconds" )
+parser.add_argument( "--checkpoint_directory", default=None,
+                     help="Where to keep the last checkpoint.  Default is <plots_directory>checkpoints/<timestamp>/" )
+parser.add_argument( "--resume_from", default=None,
+                     help="Checkpoint to resume the simulation from; the other arguments must be the same as in the "
+                          "interrupted run" )
+parser.add_argument( "--stream_probes", default=None,
+                     help="Directory where the probe data is appended after every discretised step instead of being "
+                          "kept in memory" )
+parser.add_argument( "--probe_buffer", default=10, type=float,
+                     help="Simulated seconds of probe data kept in memory before being streamed to disk or to the "
+                          "weight history.  Default is 10" )
+parser.add_argument( "--weight_history", default=None, nargs="?", const=1000, type=int,
+                     help="Keep the weights and memristors as a history of the entries changed at every sample, with "
+                          "a full keyframe every this many samples (1000 if no value is given), instead of the full "
+                          "matrices" )
+parser.add_argument( "--data_format", default="zarr", choices=[ "zarr", "csv" ],
+                     help="Format of the data saved with --plot 3: zarr (compressed binary columns in data.zarr, "
+                          "opened with data_export.load_run) or csv.  Default is zarr" )
+parser.add_argument( "--spike_events", action="store_true",
+                     help="Record the spikes of post as event lists instead of with a dense probe" )
+parser.add_argument( "--pre_cache", default=None,
+                     help="Directory of recorded pre spike trains: the first run with a given input, pre population "
+                          "and seed records them, later runs replay them instead of simulating pre" )
 
 # TODO read parameters from conf file https://docs.python.org/3/library/configparser.html
 args = parser.parse_args()
 seed = args.seed
+if (args.checkpoint_every or args.resume_from) and seed is None:
+    parser.error( "--seed is required to checkpoint or resume a run" )
+if args.spike_events and args.resume_from:
+    parser.error( "--spike_events recordings cannot be resumed" )
+if args.pre_cache and seed is None:
+    parser.error( "--seed is required to cache the pre spike trains" )
 tf.random.set_seed( seed )
 np.random.seed( seed )
 function_string = "lambda x: " + args.function
@@ -100,13 +158,21 @@ if args.verbosity >= 2:
     printlv2 = print
     progress_bar = True
 plots_directory = args.plots_directory
+if args.calibrate_gain:
+    from gain_calibration import calibrate_gain
+    
+    gain = calibrate_gain( pre_n_neurons, post_n_neurons, dimensions, function_to_learn, input_function_train,
+                           noise=np.mean( noise_percent ),
+                           exponent=exponent if exponent is not Default else -0.146,
+                           seed=seed,
+                           dt=timestep )
+    printlv2( f"Calibrated gain: {gain:.3g}" )
 device = args.device
 probe = args.probe
 generate_plots = show_plots = save_plots = save_data = False
 if args.plot >= 1:
     generate_plots = True
     show_plots = True
-    probe = 2
 if args.plot >= 2:
     save_plots = True
 if args.plot >= 3:
@@ -130,8 +196,102 @@ elif optimisations == "memory":
     optimize = False
     sample_every = timestep * 100
     simulation_discretisation = n_neurons
+if args.checkpoint_every:
+    # every discretised step ends with a checkpoint
+    simulation_discretisation = max( simulation_discretisation, int( np.ceil( sim_time / args.checkpoint_every ) ) )
+if args.stream_probes or args.weight_history:
+    # the probe data of every discretised step is flushed to disk or to the weight history
+    simulation_discretisation = max( simulation_discretisation, int( np.ceil( sim_time / args.probe_buffer ) ) )
+
+# the outputs requested and the probes each of them reads
+outputs = set()
+if probe >= 1:
+    outputs.add( "statistics" )
+if probe >= 2:
+    outputs |= { "weight_statistics", "all" }
+if generate_plots:
+    outputs |= set( args.plots if args.plots is not None else
+                    [ "results_smooth", "results", "post_spikes", "weights", "testing_smooth", "testing",
+                      "weights_mpes", "memristors" ] )
+    if not (n_neurons <= 10 and learning_rule == "mPES"):
+        outputs -= { "weights_mpes", "memristors" }
+if save_data:
+    outputs |= { "save_weights", "save_results" }
+    if learning_rule == "mPES":
+        outputs.add( "save_memristors" )
+probes_needed = {
+        "statistics"       : [ "pre", "post" ] if args.metrics == "offline" else [ ],
+        "weight_statistics": [ "weights" ],
+        "all"              : [ "pre", "post", "input", "error", "learn", "weights", "post_spikes" ] +
+                             ([ "pos_memristors", "neg_memristors" ] if learning_rule == "mPES" else [ ]),
+        "results_smooth"   : [ "input", "pre", "post" ],
+        "results"          : [ "input", "pre", "post" ],
+        "post_spikes"      : [ "post_spikes", "post" ],
+        "weights"          : [ "weights" ],
+        "testing_smooth"   : [ "pre", "post" ],
+        "testing"          : [ "pre", "post" ],
+        "weights_mpes"     : [ "pos_memristors", "neg_memristors" ],
+        "memristors"       : [ "pos_memristors", "neg_memristors" ],
+        "save_weights"     : [ "weights" ],
+        "save_results"     : [ "input", "pre", "post" ],
+        "save_memristors"  : [ "pos_memristors", "neg_memristors" ]
+        }
+probe_plan = sorted( { name for o in outputs for name in probes_needed[ o ] } )
+# the spikes of post are recorded as events instead
+record_post_spikes = args.spike_events and "post_spikes" in probe_plan
+if record_post_spikes:
+    probe_plan.remove( "post_spikes" )
+# the plots of weight matrices and memristors only draw --plot_frames and --plot_points samples at a uniform stride,
+# every other output reads all the samples; each probe is sampled as coarsely as the outputs reading it allow
+n_samples = int( sim_time / sample_every )
+output_strides = { "weights"     : stride( n_samples, args.plot_frames ),
+                   "weights_mpes": stride( n_samples, args.plot_points ),
+                   "memristors"  : stride( n_samples, args.plot_points ) }
+probe_strides = { name: min( output_strides.get( o, 1 ) for o in outputs if name in probes_needed[ o ] )
+                  for name in probe_plan }
+period = lambda name: sample_every * probe_strides.get( name, 1 )
+# name: (synapse, sample_every, values per sample)
+probe_settings = {
+        "pre"           : (0.01, period( "pre" ), dimensions),
+        "post"          : (0.01, period( "post" ), dimensions),
+        "input"         : (None, period( "input" ), dimensions),
+        "error"         : (0.01, period( "error" ), dimensions),
+        "learn"         : (None, period( "learn" ), 1),
+        "weights"       : (None, period( "weights" ), post_n_neurons * pre_n_neurons),
+        "post_spikes"   : (None, period( "post_spikes" ), post_n_neurons),
+        "pos_memristors": (None, period( "pos_memristors" ), post_n_neurons * pre_n_neurons),
+        "neg_memristors": (None, period( "neg_memristors" ), post_n_neurons * pre_n_neurons)
+        }
+bytes_per_value = 8 if backend == "nengo_core" else 4
+probe_memory = { name: int( sim_time / probe_settings[ name ][ 1 ] ) * probe_settings[ name ][ 2 ] * bytes_per_value
+                 for name in probe_plan }
+printlv2( f"Probes: {', '.join( f'{name} every {probe_settings[ name ][ 1 ]:g} s' for name in probe_plan ) or 'none'}" )
+printlv2( f"Projected probe memory: {sum( probe_memory.values() ) / 2**20:.1f} MiB "
+          f"({', '.join( f'{k} {v / 2**20:.1f} MiB' for k, v in probe_memory.items() )})" )
+if backend == "nengo_core" and (args.checkpoint_every or args.resume_from):
+    # the order of the signals of an optimised simulator is not reproducible across builds
+    optimize = False
 printlv2( f"Using {optimisations} optimisation" )
 
+pre_neuron_type = nengo.LIF()
+pre_recorder = None
+replay_pre = False
+if args.pre_cache:
+    from spike_events import ReplayLIF, SpikeRecorder, cache_path, is_recorded
+    
+    # everything the spikes of pre depend on
+    pre_cache = cache_path( args.pre_cache, { "inputs"         : args.inputs, "seed": seed, "neurons": pre_n_neurons,
+                                              "dimensions"     : dimensions, "simulation_time": sim_time,
+                                              "timestep"       : timestep, "learn_time": learn_time,
+                                              "backend"        : backend } )
+    if is_recorded( pre_cache ):
+        printlv2( f"Replaying the pre spike trains recorded in {pre_cache}" )
+        pre_neuron_type = ReplayLIF( pre_cache )
+        replay_pre = True
+    elif not args.resume_from:
+        printlv2( f"Recording the pre spike trains in {pre_cache}" )
+        pre_recorder = SpikeRecorder( pre_cache, pre_n_neurons, timestep )
+
 model = nengo.Network( seed=seed )
 with model:
     nengo_dl.configure_settings( inference_only=True )
@@ -147,7 +307,7 @@ with model:
     stop_learning = nengo.Node( output=lambda t: t >= learn_time )
     
     # Create the ensemble to represent the input, the learned output, and the error
-    pre = nengo.Ensemble( pre_n_neurons, dimensions=dimensions, seed=seed )
+    pre = nengo.Ensemble( pre_n_neurons, dimensions=dimensions, neuron_type=pre_neuron_type, seed=seed )
     post = nengo.Ensemble( post_n_neurons, dimensions=dimensions, seed=seed )
     error = nengo.Ensemble( error_n_neurons, dimensions=dimensions, radius=2, seed=seed )
     
@@ -181,29 +341,62 @@ with model:
     # Subtract the target (this would normally come from some external system)
     nengo.Connection( pre, error, function=function_to_learn, transform=-1 )
     
-    # Connect the input node to ensemble pre
-    nengo.Connection( input_node, pre )
+    # Connect the input node to ensemble pre; replayed spikes do not depend on the input current, so it is not computed
+    if not replay_pre:
+        nengo.Connection( input_node, pre )
     
     nengo.Connection(
             stop_learning,
             error.neurons,
             transform=-20 * np.ones( (error.n_neurons, 1) ) )
     
-    # essential ones are used to calculate the statistics
-    if probe > 0:
-        pre_probe = nengo.Probe( pre, synapse=0.01, sample_every=sample_every )
-        post_probe = nengo.Probe( post, synapse=0.01, sample_every=sample_every )
-    if probe > 1:
-        input_node_probe = nengo.Probe( input_node, sample_every=sample_every )
-        error_probe = nengo.Probe( error, synapse=0.01, sample_every=sample_every )
-        learn_probe = nengo.Probe( stop_learning, synapse=None, sample_every=sample_every )
-        weight_probe = nengo.Probe( conn, "weights", synapse=None, sample_every=sample_every )
-        post_spikes_probe = nengo.Probe( post.neurons, sample_every=sample_every )
-        if isinstance( conn.learning_rule_type, mPES ):
-            pos_memr_probe = nengo.Probe( conn.learning_rule, "pos_memristors", synapse=None,
-                                          sample_every=sample_every )
-            neg_memr_probe = nengo.Probe( conn.learning_rule, "neg_memristors", synapse=None,
-                                          sample_every=sample_every )
+    post_spikes_recorder = None
+    if record_post_spikes:
+        from spike_events import SpikeRecorder
+        
+        post_spikes_recorder = SpikeRecorder( (dir_data if save_data else tempfile.mkdtemp() + "/") + "post_spikes/",
+                                              post_n_neurons, timestep )
+        post_spikes_node = nengo.Node( post_spikes_recorder.step, size_in=post_n_neurons, size_out=0 )
+        nengo.Connection( post.neurons, post_spikes_node, synapse=None )
+    if pre_recorder is not None:
+        pre_recorder_node = nengo.Node( pre_recorder.step, size_in=pre_n_neurons, size_out=0 )
+        nengo.Connection( pre.neurons, pre_recorder_node, synapse=None )
+    
+    online_metrics = None
+    if "statistics" in outputs and args.metrics == "online":
+        from online_metrics import OnlineMetrics
+        
+        # sees pre and post exactly as their probes would
+        online_metrics = OnlineMetrics( function_to_learn, dimensions, learn_time, dt=timestep,
+                                        sample_every=sample_every, reservoir_size=args.metrics_sample, seed=seed )
+        metrics_node = nengo.Node( online_metrics.step, size_in=2 * dimensions, size_out=0 )
+        nengo.Connection( pre, metrics_node[ :dimensions ], synapse=0.01 )
+        nengo.Connection( post, metrics_node[ dimensions: ], synapse=0.01 )
+    
+    # only the probes read by the requested outputs are created
+    probe_targets = {
+            "pre"           : (pre, None),
+            "post"          : (post, None),
+            "input"         : (input_node, None),
+            "error"         : (error, None),
+            "learn"         : (stop_learning, None),
+            "weights"       : (conn, "weights"),
+            "post_spikes"   : (post.neurons, None),
+            "pos_memristors": (conn.learning_rule, "pos_memristors"),
+            "neg_memristors": (conn.learning_rule, "neg_memristors")
+            }
+    probes = { name: nengo.Probe( probe_targets[ name ][ 0 ], probe_targets[ name ][ 1 ],
+                                  synapse=probe_settings[ name ][ 0 ], sample_every=probe_settings[ name ][ 1 ] )
+               for name in probe_plan }
+    pre_probe = probes.get( "pre" )
+    post_probe = probes.get( "post" )
+    input_node_probe = probes.get( "input" )
+    error_probe = probes.get( "error" )
+    learn_probe = probes.get( "learn" )
+    weight_probe = probes.get( "weights" )
+    post_spikes_probe = probes.get( "post_spikes" )
+    pos_memr_probe = probes.get( "pos_memristors" )
+    neg_memr_probe = probes.get( "neg_memristors" )
 
 # Create the Simulator and run it
 printlv2( f"Backend is {backend}, running on ", end="" )
@@ -215,21 +408,100 @@ if backend == "nengo_dl":
     cm = nengo_dl.Simulator( model, seed=seed, dt=timestep, progress_bar=progress_bar, device=device )
 start_time = time.time()
 with cm as sim:
-    for i in range( simulation_discretisation ):
+    histories = { }
+    if args.weight_history:
+        from probe_store import clear_probes
+        from weight_history import WeightHistory
+        
+        histories = { name: WeightHistory( (post_n_neurons, pre_n_neurons), keyframe_every=args.weight_history,
+                                             dtype=np.float64 if backend == "nengo_core" else np.float32 )
+                      for name in [ "weights", "pos_memristors", "neg_memristors" ] if name in probes }
+    probe_store = None
+    if args.stream_probes:
+        from probe_store import ProbeStore
+        
+        probe_store = ProbeStore( args.stream_probes,
+                                  { name: p for name, p in probes.items() if name not in histories } )
+    first_step = 0
+    if args.resume_from:
+        from sim_checkpoint import load_checkpoint
+        
+        checkpoint = load_checkpoint( sim, args.resume_from )
+        if online_metrics is not None:
+            online_metrics.load_state( { k[ len( "metrics_" ): ]: v for k, v in checkpoint[ "extra" ].items()
+                                         if k.startswith( "metrics_" ) } )
+        for name, history in histories.items():
+            history.load_state( { k[ len( name ) + 1: ]: v for k, v in checkpoint[ "extra" ].items()
+                                  if k.startswith( name + "_" ) } )
+        first_step = int( np.round( sim.time / (sim_time / simulation_discretisation) ) )
+        if probe_store is not None:
+            probe_store.truncate( sim )
+        printlv2( f"Resumed from {args.resume_from} at t={sim.time:.3f} s" )
+    if args.checkpoint_every:
+        from sim_checkpoint import save_checkpoint
+        
+        checkpoint_directory = args.checkpoint_directory if args.checkpoint_directory else \
+            plots_directory + "checkpoints/" + time.strftime( "%Y-%m-%d_%H-%M-%S" ) + "/"
+        os.makedirs( checkpoint_directory, exist_ok=True )
+    for i in range( first_step, simulation_discretisation ):
         printlv2( f"\nRunning discretised step {i + 1} of {simulation_discretisation}" )
         sim.run( sim_time / simulation_discretisation )
+        for name, history in histories.items():
+            history.record( sim.data[ probes[ name ] ] )
+        if histories:
+            clear_probes( sim, [ probes[ name ] for name in histories ] )
+        if probe_store is not None:
+            probe_store.flush( sim )
+        if online_metrics is not None and online_metrics.n > 0:
+            printlv2( f"MSE so far [f(pre) vs. post]: {online_metrics.mse().tolist()}" )
+        if args.checkpoint_every and i + 1 < simulation_discretisation:
+            extra = { }
+            if online_metrics is not None:
+                extra.update( { "metrics_" + k: v for k, v in online_metrics.state().items() } )
+            for name, history in histories.items():
+                extra.update( { name + "_" + k: v for k, v in history.state().items() } )
+            save_checkpoint( sim, checkpoint_directory + "checkpoint", metadata={ "args": vars( args ) }, extra=extra )
+            printlv2( f"\nSaved checkpoint at t={sim.time:.3f} s in {checkpoint_directory}checkpoint" )
+if pre_recorder is not None:
+    pre_recorder.close()
+if post_spikes_recorder is not None:
+    from spike_events import SpikeEvents
+    
+    post_spikes_recorder.close()
+    post_spike_events = SpikeEvents( post_spikes_recorder.path )
+    printlv2( f"Recorded {post_spike_events.indptr[ -1 ]} spikes of post in {post_spikes_recorder.path}" )
 printlv2( f"\nTotal time for simulation: {time.strftime( '%H:%M:%S', time.gmtime( time.time() - start_time ) )} s" )
+# streamed probes are read back lazily from disk
+probe_data = probe_store if probe_store is not None else sim.data
+if histories:
+    # the weights and memristors are rebuilt from their history when indexed
+    probe_data = { p: probe_data[ p ] for name, p in probes.items() if name not in histories }
+    probe_data.update( { probes[ name ]: history for name, history in histories.items() } )
+    for name, history in histories.items():
+        printlv2( f"History of {name}: {history.nbytes() / 2**20:.1f} MiB instead of "
+                  f"{len( history ) * np.prod( history.shape ) * history.dtype.itemsize / 2**20:.1f} MiB" )
 
-if probe > 0:
+if "statistics" in outputs:
     # essential statistics
-    y_true = sim.data[ pre_probe ][ int( (learn_time / timestep) / (sample_every / timestep) ):, ... ]
-    y_pred = sim.data[ post_probe ][ int( (learn_time / timestep) / (sample_every / timestep) ):, ... ]
+    if online_metrics is not None:
+        mse = online_metrics.mse()
+        correlation_coefficients = online_metrics.correlations()
+    else:
+        y_true = probe_data[ pre_probe ][ int( (learn_time / timestep) / (sample_every / timestep) ):, ... ]
+        y_pred = probe_data[ post_probe ][ int( (learn_time / timestep) / (sample_every / timestep) ):, ... ]
+        # all the metrics of every dimension in one pass, sharing the ranks between Spearman and Kendall
+        metrics = correlation_metrics( function_to_learn( y_true ), y_pred, subsample=args.correlation_sample,
+                                       seed=seed )
+        mse = metrics[ "mse" ]
+        correlation_coefficients = [ metrics[ name ].tolist() for name in [ "pearson", "spearman", "kendall" ] ]
+        if "intervals" in metrics:
+            printlv2( f"95% confidence intervals on {args.correlation_sample} samples [f(pre) vs. post]:" )
+            for name, (low, high) in metrics[ "intervals" ].items():
+                printlv2( f"{name}: {low.tolist()} - {high.tolist()}" )
     # MSE after learning
     printlv2( "MSE after learning [f(pre) vs. post]:" )
-    mse = mean_squared_error( function_to_learn( y_true ), y_pred, multioutput='raw_values' )
     printlv1( mse.tolist() )
     # Correlation coefficients after learning
-    correlation_coefficients = correlations( function_to_learn( y_true ), y_pred )
     printlv2( "Pearson correlation after learning [f(pre) vs. post]:" )
     printlv1( correlation_coefficients[ 0 ] )
     printlv2( "Spearman correlation after learning [f(pre) vs. post]:" )
@@ -237,76 +509,145 @@ if probe > 0:
     printlv2( "Kendall correlation after learning [f(pre) vs. post]:" )
     printlv1( correlation_coefficients[ 2 ] )
     printlv2( "MSE-to-rho after learning [f(pre) vs. post]:" )
-    printlv1( mse_to_rho_ratio( mse, correlation_coefficients[ 1 ] ) )
+    mse_to_rho = mse_to_rho_ratio( mse, correlation_coefficients[ 1 ] )
+    printlv1( mse_to_rho )
 
-if probe > 1:
+if "weight_statistics" in outputs:
     # Average
     printlv2( "Weights average after learning:" )
-    printlv1( np.average( sim.data[ weight_probe ][ -1, ... ] ) )
+    printlv1( np.average( probe_data[ weight_probe ][ -1, ... ] ) )
     
     # Sparsity
     printlv2( "Weights sparsity at t=0 and after learning:" )
-    printlv1( gini( sim.data[ weight_probe ][ 0 ] ), end=" -> " )
-    printlv1( gini( sim.data[ weight_probe ][ -1 ] ) )
+    printlv1( gini( probe_data[ weight_probe ][ 0 ] ), end=" -> " )
+    printlv1( gini( probe_data[ weight_probe ][ -1 ] ) )
 
 plots = { }
-if generate_plots and probe > 1:
-    plotter = Plotter( sim.trange( sample_every=sample_every ), post_n_neurons, pre_n_neurons, dimensions,
-                       learn_time,
-                       sample_every,
-                       plot_size=(13, 7),
-                       dpi=300,
-                       pre_alpha=0.3
-                       )
-    plots[ "results_smooth" ] = plotter.plot_results( sim.data[ input_node_probe ], sim.data[ pre_probe ],
-                                                      sim.data[ post_probe ],
-                                                      error=
-                                                      sim.data[ post_probe ] -
-                                                      function_to_learn( sim.data[ pre_probe ] ),
-                                                      smooth=True )
-    plots[ "results" ] = plotter.plot_results( sim.data[ input_node_probe ], sim.data[ pre_probe ],
-                                               sim.data[ post_probe ],
-                                               error=
-                                               sim.data[ post_probe ] -
-                                               function_to_learn( sim.data[ pre_probe ] ),
-                                               smooth=False )
-    plots[ "post_spikes" ] = plotter.plot_ensemble_spikes( "Post", sim.data[ post_spikes_probe ],
-                                                           sim.data[ post_probe ] )
-    plots[ "weights" ] = plotter.plot_weight_matrices_over_time( sim.data[ weight_probe ], sample_every=sample_every )
+if generate_plots:
+    from decimation import decimate
     
-    plots[ "testing_smooth" ] = plotter.plot_testing( function_to_learn( sim.data[ pre_probe ] ),
-                                                      sim.data[ post_probe ],
-                                                      smooth=True )
-    plots[ "testing" ] = plotter.plot_testing( function_to_learn( sim.data[ pre_probe ] ), sim.data[ post_probe ],
-                                               smooth=False )
-    if n_neurons <= 10 and learning_rule == "mPES":
-        plots[ "weights_mpes" ] = plotter.plot_weights_over_time( sim.data[ pos_memr_probe ],
-                                                                  sim.data[ neg_memr_probe ] )
-        plots[ "memristors" ] = plotter.plot_values_over_time( sim.data[ pos_memr_probe ], sim.data[ neg_memr_probe ],
-                                                               value="resistance" )
+    # every figure gets a plotter on its own (decimated) time axis
+    make_plotter = lambda time, step=1: Plotter( time, post_n_neurons, pre_n_neurons, dimensions,
+                                                 learn_time,
+                                                 sample_every * step,
+                                                 plot_size=(13, 7),
+                                                 dpi=300,
+                                                 pre_alpha=0.3
+                                                 )
+    trange = sim.trange( sample_every=sample_every )
+    if "results_smooth" in outputs or "results" in outputs:
+        results = [ probe_data[ input_node_probe ], probe_data[ pre_probe ], probe_data[ post_probe ],
+                    probe_data[ post_probe ] - function_to_learn( probe_data[ pre_probe ] ) ]
+    if "results_smooth" in outputs:
+        plot_time, (x, y_pre, y_post, y_error), step = decimate( trange, results, args.plot_points, envelope=False )
+        plots[ "results_smooth" ] = make_plotter( plot_time, step ).plot_results( x, y_pre, y_post, error=y_error,
+                                                                                  smooth=True )
+    if "results" in outputs:
+        plot_time, (x, y_pre, y_post, y_error), step = decimate( trange, results, args.plot_points )
+        plots[ "results" ] = make_plotter( plot_time, step ).plot_results( x, y_pre, y_post, error=y_error,
+                                                                           smooth=False )
+    if "post_spikes" in outputs and record_post_spikes:
+        from spike_events import plot_spike_raster
+        
+        plot_time, (y_post,), _ = decimate( trange, [ probe_data[ post_probe ] ], args.plot_points )
+        plots[ "post_spikes" ] = plot_spike_raster( post_spike_events, y_post, plot_time, title="Post" )
+    elif "post_spikes" in outputs:
+        # spikes are not decimated, a min/max envelope of a raster is the raster itself
+        plots[ "post_spikes" ] = make_plotter( trange ).plot_ensemble_spikes( "Post", probe_data[ post_spikes_probe ],
+                                                                              probe_data[ post_probe ] )
+    if "weights" in outputs:
+        plot_time, (weights,), step = decimate( sim.trange( sample_every=probe_settings[ "weights" ][ 1 ] ),
+                                                [ probe_data[ weight_probe ] ], args.plot_frames, envelope=False )
+        step *= probe_strides[ "weights" ]
+        plots[ "weights" ] = make_plotter( plot_time, step ).plot_weight_matrices_over_time(
+                weights, sample_every=sample_every * step )
+    if "testing_smooth" in outputs or "testing" in outputs:
+        testing = [ function_to_learn( probe_data[ pre_probe ] ), probe_data[ post_probe ] ]
+    if "testing_smooth" in outputs:
+        plot_time, (y_true, y_post), step = decimate( trange, testing, args.plot_points, envelope=False )
+        plots[ "testing_smooth" ] = make_plotter( plot_time, step ).plot_testing( y_true, y_post, smooth=True )
+    if "testing" in outputs:
+        # the testing phase is found by sample index, so the samples have to stay evenly spaced
+        plot_time, (y_true, y_post), step = decimate( trange, testing, args.plot_points, envelope=False )
+        plots[ "testing" ] = make_plotter( plot_time, step ).plot_testing( y_true, y_post, smooth=False )
+    if "weights_mpes" in outputs or "memristors" in outputs:
+        # one line per device, taken at a uniform stride
+        plot_time, (pos_memristors, neg_memristors), step = decimate(
+                sim.trange( sample_every=probe_settings[ "pos_memristors" ][ 1 ] ),
+                [ probe_data[ pos_memr_probe ], probe_data[ neg_memr_probe ] ], args.plot_points, envelope=False )
+        step *= probe_strides[ "pos_memristors" ]
+    if "weights_mpes" in outputs:
+        plots[ "weights_mpes" ] = make_plotter( plot_time, step ).plot_weights_over_time( pos_memristors,
+                                                                                          neg_memristors )
+    if "memristors" in outputs:
+        plots[ "memristors" ] = make_plotter( plot_time, step ).plot_values_over_time( pos_memristors,
+                                                                                       neg_memristors,
+                                                                                       value="resistance" )
 
+figures = FigurePipeline( args.figure_workers )
 if save_plots:
-    assert generate_plots and probe > 1
+    assert generate_plots
     
-    for fig in plots.values():
-        fig.savefig( dir_images + str( i ) + ".pdf" )
-        # fig.savefig( dir_images + str( i ) + ".png" )
-    
-    print( f"Saved plots in {dir_images}" )
+    # written in the background while the data is saved
+    for name, fig in plots.items():
+        figures.save( fig, dir_images + name + ".pdf", close=not show_plots )
+        # figures.save( fig, dir_images + name + ".png", close=not show_plots )
 
-if save_data:
-    save_weights( dir_data, sim.data[ weight_probe ] )
+if save_data and args.data_format == "zarr":
+    from data_export import export_run
+    
+    start_time = time.time()
+    saved = [ "input", "pre", "post", "weights" ] + ([ "pos_memristors", "neg_memristors" ]
+                                                     if "save_memristors" in outputs else [ ])
+    export_run( dir_data + "data.zarr", sim.trange( sample_every=sample_every ),
+                dict( { name: probe_data[ probes[ name ] ] for name in saved if name not in histories },
+                      error=probe_data[ post_probe ] - function_to_learn( probe_data[ pre_probe ] ) ),
+                histories={ name: history for name, history in histories.items() if name in saved },
+                attrs={ "dt"    : timestep, "sample_every": sample_every, "learn_time": learn_time,
+                        "config": dict( vars( args ), gain=gain, pre_neurons=pre_n_neurons,
+                                        post_neurons=post_n_neurons, error_neurons=error_n_neurons ) } )
+    print( f"Saved data in {dir_data}data.zarr in {time.time() - start_time:.2f} s" )
+elif save_data:
+    if "weights" in histories:
+        histories[ "weights" ].save( dir_data + "weights_history.npz" )
+    else:
+        save_weights( dir_data, probe_data[ weight_probe ] )
     print( f"Saved NumPy weights in {dir_data}" )
     
-    save_results_to_csv( dir_data, sim.data[ input_node_probe ], sim.data[ pre_probe ], sim.data[ post_probe ],
-                         sim.data[ post_probe ] - function_to_learn( sim.data[ pre_probe ] ) )
-    save_memristors_to_csv( dir_data, sim.data[ pos_memr_probe ], sim.data[ neg_memr_probe ] )
+    save_results_to_csv( dir_data, probe_data[ input_node_probe ], probe_data[ pre_probe ], probe_data[ post_probe ],
+                         probe_data[ post_probe ] - function_to_learn( probe_data[ pre_probe ] ) )
+    if "save_memristors" in outputs:
+        save_memristors_to_csv( dir_data, probe_data[ pos_memr_probe ], probe_data[ neg_memr_probe ] )
     print( f"Saved data in {dir_data}" )
 
 #     TODO save output txt with metrics
 
+# register the run in the catalog of all experiments
+run_metrics = { }
+if "statistics" in outputs:
+    run_metrics = { "mse"       : mse,
+                    "pearson"   : correlation_coefficients[ 0 ],
+                    "spearman"  : correlation_coefficients[ 1 ],
+                    "kendall"   : correlation_coefficients[ 2 ],
+                    "mse_to_rho": mse_to_rho }
+run_artifacts = { }
+if save_plots:
+    run_artifacts[ "images" ] = dir_images
+if save_data:
+    run_artifacts[ "data" ] = dir_data
+register_run( plots_directory + "catalog.sqlite", __file__,
+              directory=dir_name if save_plots or save_data else None,
+              config=dict( vars( args ), gain=gain, pre_neurons=pre_n_neurons, post_neurons=post_n_neurons,
+                           error_neurons=error_n_neurons ),
+              metrics=run_metrics,
+              artifacts=run_artifacts )
+
 if show_plots:
-    assert generate_plots and probe > 1
+    assert generate_plots
     
     for fig in plots.values():
         fig.show()
+
+figures.wait()
+if save_plots:
+    print( f"Saved plots in {dir_images}" )
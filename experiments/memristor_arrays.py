@@ -0,0 +1,232 @@
+from functools import partial
+
+import numpy as np
+
+
+# Struct-of-arrays memristor models: every parameter and the state of every device live in contiguous NumPy arrays
+# of the same shape so that a pulse is applied to the whole crossbar with a handful of array operations instead of
+# one Python method call per device.  Equations follow memristor_learning.MemristorModels:
+#   SET   (V > 0): R(n) = r_0 + r_1 * n**(a + b * V)
+#   RESET (V < 0): R(n) = r_3 - r_3 * n**(c + d * V)
+
+
+def _noisy( value, noise, shape, rng ):
+    value = np.broadcast_to( np.asarray( value, dtype=np.float64 ), shape )
+    if noise == 0:
+        return np.array( value, dtype=np.float64, order="C" )
+
+    return np.ascontiguousarray( rng.normal( value, np.abs( value ) * noise ) )
+
+
+class MemristorAnoukArray:
+    def __init__( self, shape, r_0=1e2, r_1=2.5e8, a=-0.128, b=0.0, r_init=(1e8, 1.1e8), noise=0.0, seed=None,
+                  rng=None ):
+        self.shape = tuple( np.atleast_1d( shape ) )
+        rng = rng if rng is not None else np.random.RandomState( seed )
+
+        self.r_0 = _noisy( r_0, noise, self.shape, rng )
+        self.r_1 = _noisy( r_1, noise, self.shape, rng )
+        self.a = _noisy( a, noise, self.shape, rng )
+        self.b = _noisy( b, noise, self.shape, rng )
+        if np.isscalar( r_init ):
+            self.resistance = _noisy( r_init, noise, self.shape, rng )
+        else:
+            self.resistance = np.ascontiguousarray( rng.uniform( r_init[ 0 ], r_init[ 1 ], self.shape ) )
+
+    def set_exponent( self, V, mask=Ellipsis ):
+        return self.a[ mask ] + self.b[ mask ] * V
+
+    def compute_pulse_number( self, R, V, mask=Ellipsis ):
+        exponent = self.set_exponent( V, mask )
+
+        return np.power( (R - self.r_0[ mask ]) / self.r_1[ mask ], 1 / exponent )
+
+    def compute_resistance( self, n, V, mask=Ellipsis ):
+        exponent = self.set_exponent( V, mask )
+
+        return self.r_0[ mask ] + self.r_1[ mask ] * np.power( n, exponent )
+
+    def _set( self, mask, V ):
+        # clip values outside [R_0,R_1]
+        R = np.clip( self.resistance[ mask ], self.r_0[ mask ], self.r_1[ mask ] )
+        n = self.compute_pulse_number( R, V, mask )
+        self.resistance[ mask ] = self.compute_resistance( n + 1, V, mask )
+
+    def _reset( self, mask, V ):
+        # one-directional devices do not respond to negative pulses
+        pass
+
+    def pulse( self, V, mask=None ):
+        V = np.broadcast_to( np.asarray( V, dtype=np.float64 ), self.shape )
+        mask = np.ones( self.shape, dtype=bool ) if mask is None else np.asarray( mask, dtype=bool )
+
+        set_mask = mask & (V > 0)
+        reset_mask = mask & (V < 0)
+        if np.any( set_mask ):
+            self._set( set_mask, V[ set_mask ] )
+        if np.any( reset_mask ):
+            self._reset( reset_mask, V[ reset_mask ] )
+
+    @property
+    def conductance( self ):
+        return 1.0 / self.resistance
+
+    def normalised_conductance( self ):
+        g_min = 1.0 / self.r_1
+        g_max = 1.0 / self.r_0
+
+        return (self.conductance - g_min) / (g_max - g_min)
+
+
+class OnedirectionalPowerlawMemristorArray( MemristorAnoukArray ):
+    def __init__( self, shape, a=-0.146, r_0=2e2, r_1=2.3e8, **kwargs ):
+        super().__init__( shape, r_0=r_0, r_1=r_1, a=a, b=0.0, **kwargs )
+
+
+class MemristorAnoukBidirectionalArray( MemristorAnoukArray ):
+    def __init__( self, shape, r_0=1e2, r_1=2.5e8, r_3=1e9, a=-0.0929, b=-0.5324, c=-0.0498, d=0.0, noise=0.0,
+                  seed=None, rng=None, **kwargs ):
+        rng = rng if rng is not None else np.random.RandomState( seed )
+        super().__init__( shape, r_0=r_0, r_1=r_1, a=a, b=b, noise=noise, rng=rng, **kwargs )
+
+        self.r_3 = _noisy( r_3, noise, self.shape, rng )
+        self.c = _noisy( c, noise, self.shape, rng )
+        self.d = _noisy( d, noise, self.shape, rng )
+
+    def reset_exponent( self, V, mask=Ellipsis ):
+        return self.c[ mask ] + self.d[ mask ] * V
+
+    def _reset( self, mask, V ):
+        exponent = self.reset_exponent( V, mask )
+        r_3 = self.r_3[ mask ]
+
+        R = np.clip( self.resistance[ mask ], self.r_0[ mask ], r_3 )
+        n = np.power( (r_3 - R) / r_3, 1 / exponent )
+        self.resistance[ mask ] = r_3 - r_3 * np.power( n + 1, exponent )
+
+
+class BidirectionalPowerlawMemristorArray( MemristorAnoukBidirectionalArray ):
+    def __init__( self, shape, a=-0.146, c=-0.146, r_0=2e2, r_1=2.3e8, r_3=None, **kwargs ):
+        r_3 = r_0 + r_1 if r_3 is None else r_3
+        super().__init__( shape, r_0=r_0, r_1=r_1, r_3=r_3, a=a, b=0.0, c=c, d=0.0, **kwargs )
+
+
+# Differential pairs: the weight of a synapse is the difference in normalised conductance of its two devices
+class MemristorPlusMinusArray:
+    def __init__( self, shape, model=MemristorAnoukArray, seed=None ):
+        rng = np.random.RandomState( seed )
+
+        self.pos = model( shape, rng=rng )
+        self.neg = model( shape, rng=rng )
+        self.shape = self.pos.shape
+
+    def update( self, direction, base_voltage=1e-1 ):
+        # a positive update potentiates the positive device, a negative update potentiates the negative device
+        self.pos.pulse( base_voltage, mask=direction > 0 )
+        self.neg.pulse( base_voltage, mask=direction < 0 )
+
+    def weights( self ):
+        return self.pos.normalised_conductance() - self.neg.normalised_conductance()
+
+
+class MemristorComplementaryArray( MemristorPlusMinusArray ):
+    def __init__( self, shape, model=MemristorAnoukBidirectionalArray, seed=None ):
+        super().__init__( shape, model=model, seed=seed )
+
+    def update( self, direction, base_voltage=1e-1, reset_voltage=None ):
+        # each update potentiates one device of the pair and depresses the other one
+        reset_voltage = -base_voltage if reset_voltage is None else reset_voltage
+
+        self.pos.pulse( base_voltage, mask=direction > 0 )
+        self.neg.pulse( reset_voltage, mask=direction > 0 )
+        self.neg.pulse( base_voltage, mask=direction < 0 )
+        self.pos.pulse( reset_voltage, mask=direction < 0 )
+
+
+# One device per synapse: a positive update SETs it and a negative update RESETs it (bidirectional models only)
+class MemristorSingleArray:
+    def __init__( self, shape, model=MemristorAnoukBidirectionalArray, seed=None ):
+        self.device = model( shape, rng=np.random.RandomState( seed ) )
+        self.shape = self.device.shape
+
+    def update( self, direction, base_voltage=1e-1, reset_voltage=None ):
+        reset_voltage = -base_voltage if reset_voltage is None else reset_voltage
+
+        self.device.pulse( base_voltage, mask=direction > 0 )
+        self.device.pulse( reset_voltage, mask=direction < 0 )
+
+    def weights( self ):
+        return self.device.normalised_conductance()
+
+
+# struct-of-arrays counterparts of the memristor_learning models, by class name so that memristor_learning is only
+# needed by the callers that already use it
+DEVICE_ARRAYS = { "MemristorAnouk"                 : MemristorAnoukArray,
+                  "OnedirectionalPowerlawMemristor": OnedirectionalPowerlawMemristorArray,
+                  "MemristorAnoukBidirectional"    : MemristorAnoukBidirectionalArray,
+                  "BidirectionalPowerlawMemristor" : BidirectionalPowerlawMemristorArray }
+PAIR_ARRAYS = { "MemristorPlusMinus"    : MemristorPlusMinusArray,
+                "MemristorComplementary": MemristorComplementaryArray }
+
+
+def array_model( memristor_model ):
+    # converts a memristor_model factory of SupervisedLearning, e.g.
+    #   partial( MemristorPlusMinus, model=partial( OnedirectionalPowerlawMemristor, a=-0.1, r_0=1e2, r_1=2.5e8 ) )
+    # into the factory of the equivalent crossbar, called as model( shape, seed=seed )
+    function = getattr( memristor_model, "func", memristor_model )
+    keywords = dict( getattr( memristor_model, "keywords", { } ) )
+    name = getattr( function, "__name__", None )
+    if name in PAIR_ARRAYS:
+        device = keywords.pop( "model", None )
+        pair = PAIR_ARRAYS[ name ]
+        if device is None:
+            return partial( pair, **keywords )
+        return partial( pair, model=partial( DEVICE_ARRAYS[ getattr( device, "func", device ).__name__ ],
+                                             **getattr( device, "keywords", { } ) ), **keywords )
+    if name in DEVICE_ARRAYS:
+        return partial( MemristorSingleArray, model=partial( DEVICE_ARRAYS[ name ], **keywords ) )
+
+    raise ValueError( f"No array version of the memristor model {memristor_model}" )
+
+
+class CrossbarController:
+    # vectorised crossbar controller, used as the function of a nengo.Node: the input is the concatenation of the pre
+    # activities and of the error, the output the current injected into post.  Devices are only pulsed where the pre
+    # neuron spiked and the error exceeded the threshold.  model is an array factory, see MemristorArrayController for
+    # the memristor_model factories of SupervisedLearning
+
+    def __init__( self, model, in_size, out_size, gain=1e4, error_threshold=1e-5, base_voltage=1e-1, dt=0.001,
+                  seed=None ):
+        self.input_size = in_size
+        self.output_size = out_size
+        self.gain = gain
+        self.error_threshold = error_threshold
+        self.base_voltage = base_voltage
+        self.dt = dt
+
+        self.memristors = model( (out_size, in_size), seed=seed )
+        self.weights = self.gain * self.memristors.weights()
+
+    def __call__( self, t, x ):
+        input_activities = x[ :self.input_size ]
+        error = x[ self.input_size: ]
+
+        if np.any( np.abs( error ) > self.error_threshold ):
+            spiked = np.rint( input_activities * self.dt ).astype( bool )
+            pes_delta = np.outer( -error, input_activities )
+            pes_delta[ :, ~spiked ] = 0
+
+            self.memristors.update( np.sign( pes_delta ), base_voltage=self.base_voltage )
+            self.weights = self.gain * self.memristors.weights()
+
+        return np.dot( self.weights, input_activities )
+
+
+class MemristorArrayController( CrossbarController ):
+    # memristor_controller for memristor_learning.Networks.SupervisedLearning in place of
+    # memristor_learning.Networks.MemristorArray: takes the same memristor_model factories (single devices or
+    # MemristorPlusMinus/MemristorComplementary pairs) and pulses the whole crossbar at once.  The options of the
+    # per-device controller without a vectorised counterpart (learning_rule, dimensions, voltage_converter,
+    # weight_modifier, ...) are accepted and ignored
+    def __init__( self, model, in_size, out_size, base_voltage=1e-1, seed=None, **kwargs ):
+        super().__init__( array_model( model ), in_size, out_size, base_voltage=base_voltage, seed=seed )
@@ -0,0 +1,122 @@
+import numpy as np
+
+from correlation_metrics import correlation_metrics
+
+
+# Learning performance metrics accumulated while the simulation runs, so that no probe data has to be stored to
+# compute them.  The MSE and the Pearson correlation are exact (running sums and co-moments, merged batch by batch);
+# the Spearman and Kendall correlations need the ranks of the whole series and are estimated on a uniform reservoir
+# sample of it (Algorithm R), which is exact as long as the series is not longer than the reservoir.
+# OnlineMetrics.step is the function of a Node receiving [ pre, post ] with the same synapse as the probes it replaces,
+# only the samples taken after start_time (every sample_every) are used, as when slicing the probe data.
+
+class OnlineMetrics:
+    def __init__( self, function_to_learn, dimensions, start_time, dt=0.001, sample_every=None, reservoir_size=10000,
+                  seed=None ):
+        self.function_to_learn = function_to_learn
+        self.dimensions = dimensions
+        self.start_step = int( np.round( start_time / dt ) )
+        self.dt = dt
+        self.period = max( int( np.round( (sample_every if sample_every is not None else dt) / dt ) ), 1 )
+        self.reservoir_size = reservoir_size
+        self.seed = seed
+        self.reset()
+
+    def reset( self ):
+        self.rng = np.random.RandomState( self.seed )
+        self.last_step = 0
+        self.n = 0
+        self.squared_error = np.zeros( self.dimensions )
+        self.mean_true = np.zeros( self.dimensions )
+        self.mean_pred = np.zeros( self.dimensions )
+        self.m2_true = np.zeros( self.dimensions )
+        self.m2_pred = np.zeros( self.dimensions )
+        self.comoment = np.zeros( self.dimensions )
+        self.reservoir = np.zeros( (self.reservoir_size, 2, self.dimensions) )
+
+    def step( self, t, x ):
+        # Nengo calls the function once at build time with t=0 to find the size of its output
+        if t <= 0:
+            return
+        step = int( np.round( t / self.dt ) )
+        # the simulator was reset
+        if step <= self.last_step:
+            self.reset()
+        self.last_step = step
+        if step > self.start_step and step % self.period == 0:
+            self.update( x[ None, :self.dimensions ], x[ None, self.dimensions: ] )
+
+    def update( self, pre, post ):
+        # pre and post are (samples, dimensions) blocks of decoded values
+        y_true = np.asarray( self.function_to_learn( pre ), dtype=float ).reshape( -1, self.dimensions )
+        y_pred = np.asarray( post, dtype=float ).reshape( -1, self.dimensions )
+        m = y_true.shape[ 0 ]
+        if m == 0:
+            return
+
+        # merge of the co-moments of the block with the running ones (Chan et al.)
+        n = self.n + m
+        block_mean_true = y_true.mean( axis=0 )
+        block_mean_pred = y_pred.mean( axis=0 )
+        delta_true = block_mean_true - self.mean_true
+        delta_pred = block_mean_pred - self.mean_pred
+        self.m2_true += ((y_true - block_mean_true)**2).sum( axis=0 ) + delta_true**2 * self.n * m / n
+        self.m2_pred += ((y_pred - block_mean_pred)**2).sum( axis=0 ) + delta_pred**2 * self.n * m / n
+        self.comoment += ((y_true - block_mean_true) * (y_pred - block_mean_pred)).sum( axis=0 ) + \
+                         delta_true * delta_pred * self.n * m / n
+        self.mean_true += delta_true * m / n
+        self.mean_pred += delta_pred * m / n
+        self.squared_error += ((y_true - y_pred)**2).sum( axis=0 )
+
+        for i in range( m ):
+            k = self.n + i
+            slot = k if k < self.reservoir_size else self.rng.randint( 0, k + 1 )
+            if slot < self.reservoir_size:
+                self.reservoir[ slot, 0 ] = y_true[ i ]
+                self.reservoir[ slot, 1 ] = y_pred[ i ]
+        self.n = n
+
+    def sample( self ):
+        # the reservoir as (f(pre), post) pairs of (samples, dimensions) arrays
+        sample = self.reservoir[ :min( self.n, self.reservoir_size ) ]
+
+        return sample[ :, 0 ], sample[ :, 1 ]
+
+    def mse( self ):
+        return self.squared_error / self.n
+
+    def pearson( self ):
+        return (self.comoment / np.sqrt( self.m2_true * self.m2_pred )).tolist()
+
+    def _rank_correlations( self ):
+        y_true, y_pred = self.sample()
+        metrics = correlation_metrics( y_true, y_pred )
+
+        return metrics[ "spearman" ].tolist(), metrics[ "kendall" ].tolist()
+
+    def spearman( self ):
+        return self._rank_correlations()[ 0 ]
+
+    def kendall( self ):
+        return self._rank_correlations()[ 1 ]
+
+    def correlations( self ):
+        # same layout as extras.correlations: [ pearson, spearman, kendall ], one value per dimension
+        return [ self.pearson(), *self._rank_correlations() ]
+
+    def state( self ):
+        # arrays from which load_state restores the accumulators, e.g. when resuming from a checkpoint
+        _, keys, position, has_gauss, cached_gaussian = self.rng.get_state()
+
+        return dict( counters=np.array( [ self.n, self.last_step ] ), squared_error=self.squared_error,
+                     mean_true=self.mean_true, mean_pred=self.mean_pred, m2_true=self.m2_true, m2_pred=self.m2_pred,
+                     comoment=self.comoment, reservoir=self.reservoir, rng_keys=keys,
+                     rng_rest=np.array( [ position, has_gauss, cached_gaussian ] ) )
+
+    def load_state( self, state ):
+        self.n, self.last_step = (int( v ) for v in state[ "counters" ])
+        for name in [ "squared_error", "mean_true", "mean_pred", "m2_true", "m2_pred", "comoment", "reservoir" ]:
+            setattr( self, name, np.array( state[ name ] ) )
+        position, has_gauss, cached_gaussian = state[ "rng_rest" ]
+        self.rng.set_state( ("MT19937", np.array( state[ "rng_keys" ] ), int( position ), int( has_gauss ),
+                             float( cached_gaussian )) )
@@ -1,11 +1,12 @@
-import pickle
 import time
 from functools import partial
 import os
-import xarray as xr
 from tabulate import tabulate
 
 from memristor_learning.Networks import *
+from memristor_arrays import MemristorArrayController
+from sweep_store import SweepSink
+from run_catalog import register_run
 
 # parameters to search
 start_a = -0.0001
@@ -25,34 +26,33 @@ coords = dict.fromkeys( dims, 0 )
 coords[ dims[ 0 ] ] = a_list
 coords[ dims[ 1 ] ] = c_list
 
-data = [ ]
-results_dict = nested_dict( len( dims ), dict )
+# (i, j) indices of the cells whose figures are generated and saved
+figure_cells = [ ]
+
+dir_name, dir_images = make_timestamped_dir( root="../data/parameter_search/mCompl/" )
+# every finished cell is written to disk straight away, open it with sweep_store.open_sweep()
+sink = SweepSink( f"{dir_name}results.zarr", dims, coords, figure_cells=figure_cells, figures_directory=dir_images )
 
 start_time = time.time()
 curr_iteration = 0
 for i, a in enumerate( a_list ):
-    data.append( [ ] )
     for j, c in enumerate( c_list ):
-        net = SupervisedLearning( memristor_controller=MemristorArray,
+        net = SupervisedLearning( memristor_controller=MemristorArrayController,
                                   memristor_model=
                                   partial( MemristorPlusMinus, model=
                                   partial( BidirectionalPowerlawMemristor, a=-0.223, c=-0.001, r_0=1e2, r_1=2.5e8 ) ),
                                   seed=0,
                                   neurons=4,
                                   verbose=False,
-                                  generate_figures=False )
+                                  generate_figures=sink.wants_figures( (i, j) ) )
         res = net()
         print( res[ "mse" ] )
-        data[ i ].append( res[ "mse" ] )
-        results_dict[ a ][ c ] = res
+        sink.write( (i, j), res )
+        del res
         curr_iteration += 1
         print( f"{curr_iteration}/{total_iterations}: {a}, {c}\n" )
 
 time_taken = time.time() - start_time
-dir_name, dir_images = make_timestamped_dir( root="../data/parameter_search/mCompl/" )
-dataf = xr.DataArray( data=data, dims=dims, coords=coords )
-with open( f"{dir_name}mse.pkl", "wb" ) as f:
-    pickle.dump( dataf, f )
 table = [ [ "exponent", start_a, end_a, num_a ],
           [ "c", start_c, end_c, num_c ] ]
 headers = [ "Parameter", "Start", "End", "Number" ]
@@ -61,4 +61,8 @@ with open( f"{dir_name}param.txt", "w+" ) as f:
     f.write( f"\n\nTotal time: {datetime.timedelta( seconds=time_taken )}" )
     f.write( f"\nTime per iteration: {round( time_taken / total_iterations, 2 )} s" )
     
-    # loaded = pickle.load( open( f"{dir_name}mse.pkl", "rb" ) )
+    # loaded = open_sweep( f"{dir_name}results.zarr" )
+
+register_run( "../data/catalog.sqlite", __file__, directory=dir_name,
+              config={ "exponent": [ start_a, end_a, num_a ], "c": [ start_c, end_c, num_c ] },
+              artifacts={ "results": f"{dir_name}results.zarr", "images": dir_images } )
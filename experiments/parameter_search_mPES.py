@@ -1,159 +1,267 @@
 import argparse
+import warnings
 from subprocess import run
 
 from memristor_nengo.extras import *
+from figure_pipeline import FigurePipeline
+from run_catalog import register_run
 
 parser = argparse.ArgumentParser()
-parser.add_argument( "-p", "--parameter", choices=[ "exponent", "noise", "neurons", "gain" ], required=True )
+parser.add_argument( "-p", "--parameter", choices=[ "exponent", "noise", "neurons", "gain" ] )
 parser.add_argument( "-f", "--function", default="x" )
 parser.add_argument( "-D", "--dimensions", default=3, type=int )
 parser.add_argument( "-N", "--neurons", type=int, default=10 )
 parser.add_argument( "-i", "--inputs", default=[ "sine", "sine" ], nargs="*", choices=[ "sine", "white" ] )
-parser.add_argument( "-l", "--limits", nargs=2, type=float, required=True )
+parser.add_argument( "-l", "--limits", nargs=2, type=float )
 parser.add_argument( "-n", "--number", type=int )
-parser.add_argument( "-a", "--averaging", type=int, required=True )
+parser.add_argument( "-a", "--averaging", type=int )
 parser.add_argument( "-d", "--directory", default="../data/" )
+parser.add_argument( "-G", "--calibrate_gain", action="store_true",
+                     help="Let mPES.py estimate the gain instead of using its default" )
+parser.add_argument( "--pre_cache", default=None,
+                     help="Let mPES.py record the pre spike trains once per seed in this directory and replay them "
+                          "in the following runs" )
+parser.add_argument( "-r", "--role", default="local", choices=[ "local", "enqueue", "worker", "aggregate" ],
+                     help="local: run the whole search here, enqueue: put the (parameter, seed) jobs in --queue, "
+                          "worker: run jobs from --queue until it is drained, aggregate: save the results of --queue" )
+parser.add_argument( "-q", "--queue", default=None,
+                     help="SQLite file on a filesystem shared by all the workers" )
+parser.add_argument( "--heartbeat_timeout", default=300, type=float,
+                     help="Seconds after which the job of a silent worker is given to another worker" )
+parser.add_argument( "--max_attempts", default=3, type=int )
 args = parser.parse_args()
+
+if args.role != "local":
+    if args.queue is None:
+        parser.error( f"--queue is required with --role {args.role}" )
+    from job_queue import JobQueue, gather_results, run_worker
+
+    queue = JobQueue( args.queue, heartbeat_timeout=args.heartbeat_timeout, max_attempts=args.max_attempts )
+if args.role in [ "local", "enqueue" ]:
+    if args.parameter is None or args.limits is None or args.averaging is None:
+        parser.error( "--parameter, --limits and --averaging are required to define a search" )
+    search = vars( args )
+else:
+    # workers and the aggregation step use the search that was enqueued
+    search = queue.get_meta( "search" )
+    if search is None:
+        parser.error( f"No search has been enqueued in {args.queue}" )
 # parameters to search
-function = args.function
-dimensions = args.dimensions
-neurons = args.neurons
-inputs = args.inputs
-parameter = args.parameter
-start_par = args.limits[ 0 ]
-end_par = args.limits[ 1 ]
-num_par = args.number if args.parameter in [ "exponent", "noise", "neurons" ] else end_par - start_par + 1
-num_averaging = args.averaging
+function = search[ "function" ]
+dimensions = search[ "dimensions" ]
+neurons = search[ "neurons" ]
+inputs = search[ "inputs" ]
+parameter = search[ "parameter" ]
+start_par = search[ "limits" ][ 0 ]
+end_par = search[ "limits" ][ 1 ]
+num_par = search[ "number" ] if parameter in [ "exponent", "noise", "neurons" ] else end_par - start_par + 1
+num_averaging = search[ "averaging" ]
 directory = args.directory
+calibrate_gain = [ "-G" ] if search[ "calibrate_gain" ] and parameter != "gain" else [ ]
+pre_cache = [ "--pre_cache", search[ "pre_cache" ] ] if search.get( "pre_cache" ) else [ ]
 
-dir_name, dir_images, dir_data = make_timestamped_dir( root=directory + "parameter_search/" + str( parameter ) + "/" )
-print( "Reserved folder", dir_name )
-
-res_list = np.linspace( start_par, end_par, num=num_par ) if args.parameter in [ "exponent", "noise", "neurons" ] \
+res_list = np.linspace( start_par, end_par, num=num_par ) if parameter in [ "exponent", "noise", "neurons" ] \
     else np.logspace( np.rint( start_par ).astype( int ), np.rint( end_par ).astype( int ),
                       num=np.rint( num_par ).astype( int ) )
 num_parameters = len( res_list )
-print( "Evaluation for", parameter, "with", neurons, "neurons" )
-print( f"Search limits of parameters: [{start_par},{end_par}]" )
-print( "Number of parameters:", num_parameters )
-print( "Averaging per parameter", num_averaging )
-print( "Total iterations", num_parameters * num_averaging )
-
-mse_list = [ ]
-pearson_list = [ ]
-spearman_list = [ ]
-kendall_list = [ ]
-mse_to_rho_list = [ ]
-counter = 0
-for k, par in enumerate( res_list ):
-    print( f"Parameter #{k} ({par})" )
-    it_res_mse = [ ]
-    it_res_pearson = [ ]
-    it_res_spearman = [ ]
-    it_res_kendall = [ ]
-    it_res_mse_to_rho = [ ]
-    for avg in range( num_averaging ):
-        counter += 1
-        print( f"[{counter}/{num_parameters * num_averaging}] Averaging #{avg + 1}" )
-        if parameter == "exponent":
-            result = run(
-                    [ "python", "mPES.py", "--verbosity", str( 1 ), "-P", str( par ), "-N", str( neurons ), "-f",
-                      str( function ), "-D", str( dimensions ) ]
-                    + [ "-i" ] + inputs,
-                    capture_output=True,
-                    universal_newlines=True )
-        if parameter == "noise":
-            result = run(
-                    [ "python", "mPES.py", "--verbosity", str( 1 ), "-n", str( par ), "-N", str( neurons ), "-f",
-                      str( function ), "-D", str( dimensions ) ]
-                    + [ "-i" ] + inputs,
-                    capture_output=True,
-                    universal_newlines=True )
-        if parameter == "neurons":
-            rounded_neurons = str( np.rint( par ).astype( int ) )
-            result = run(
-                    [ "python", "mPES.py", "--verbosity", str( 1 ), "-N", str( 100 ), rounded_neurons, str( 100 ), "-N",
-                      str( neurons ), "-f", str( function ), "-D", str( dimensions ) ]
-                    + [ "-i" ] + inputs,
-                    capture_output=True,
-                    universal_newlines=True )
-        if parameter == "gain":
-            result = run(
-                    [ "python", "mPES.py", "--verbosity", str( 1 ), "-g", str( par ), "-f", str( function ),
-                      "-D", str( dimensions ), "-N", str( neurons ) ]
-                    + [ "-i" ] + inputs,
-                    capture_output=True,
-                    universal_newlines=True )
-        # save statistics
-        try:
-            mse = np.mean( [ float( i ) for i in result.stdout.split( "\n" )[ 0 ][ 1:-1 ].split( "," ) ] )
-            print( "MSE", mse )
-            it_res_mse.append( mse )
-            pearson = np.mean( [ float( i ) for i in result.stdout.split( "\n" )[ 1 ][ 1:-1 ].split( "," ) ] )
-            print( "Pearson", pearson )
-            it_res_pearson.append( pearson )
-            spearman = np.mean( [ float( i ) for i in result.stdout.split( "\n" )[ 2 ][ 1:-1 ].split( "," ) ] )
-            print( "Spearman", spearman )
-            it_res_spearman.append( spearman )
-            kendall = np.mean( [ float( i ) for i in result.stdout.split( "\n" )[ 3 ][ 1:-1 ].split( "," ) ] )
-            print( "Kendall", kendall )
-            it_res_kendall.append( kendall )
-            mse_to_rho = np.mean( [ float( i ) for i in result.stdout.split( "\n" )[ 4 ][ 1:-1 ].split( "," ) ] )
-            print( "MSE-to-rho", mse_to_rho )
-            it_res_mse_to_rho.append( mse_to_rho )
-        except:
-            print( "Ret", result.returncode )
-            print( "Out", result.stdout )
-            print( "Err", result.stderr )
-    mse_list.append( it_res_mse )
-    pearson_list.append( it_res_pearson )
-    spearman_list.append( it_res_spearman )
-    kendall_list.append( it_res_kendall )
-    mse_to_rho_list.append( it_res_mse_to_rho )
-
-mse_means = np.mean( mse_list, axis=1 )
-pearson_means = np.mean( pearson_list, axis=1 )
-spearman_means = np.mean( spearman_list, axis=1 )
-kendall_means = np.mean( kendall_list, axis=1 )
-mse_to_rho_means = np.mean( mse_to_rho_list, axis=1 )
-print( "Average MSE for each parameter:", mse_means )
-print( "Average Pearson for each parameter:", pearson_means )
-print( "Average Spearman for each parameter:", spearman_means )
-print( "Average Kendall for each parameter:", kendall_means )
-print( "Average MSE-to-rho for each parameter:", mse_to_rho_means )
-
-fig = plt.figure()
-ax = fig.add_subplot( 111 )
-ax.plot( res_list, mse_means, label="MSE" )
-ax.legend()
-fig.savefig( dir_images + "mse" + ".pdf" )
-
-fig = plt.figure()
-ax = fig.add_subplot( 111 )
-ax.plot( res_list, pearson_means, label="Pearson" )
-ax.plot( res_list, spearman_means, label="Spearman" )
-ax.plot( res_list, kendall_means, label="Kendall" )
-ax.legend()
-fig.savefig( dir_images + "correlations" + ".pdf" )
-
-fig = plt.figure()
-ax = fig.add_subplot( 111 )
-ax.plot( res_list, mse_to_rho_means, label=r"$\frac{\rho}{\mathrm{MSE}}$" )
-ax.legend()
-fig.savefig( dir_images + "mse-to-rho" + ".pdf" )
-
-print( f"Saved plots in {dir_images}" )
-
-np.savetxt( dir_data + "results.csv",
-            np.stack( (res_list, mse_means, pearson_means, spearman_means, kendall_means, mse_to_rho_means), axis=1 ),
-            delimiter=",", header=parameter + ",MSE,Pearson,Spearman,Kendall,MSE-to-rho", comments="" )
-with open( dir_data + "parameters.txt", "w" ) as f:
-    f.write( f"Parameter: {parameter}\n" )
-    f.write( f"Function: {function}\n" )
-    f.write( f"Dimensions: {dimensions}\n" )
-    f.write( f"Neurons: {neurons}\n" )
-    f.write( f"Input: {inputs}\n" )
-    f.write( f"Limits: [{start_par},{end_par}]\n" )
-    f.write( f"Number of searched parameters: {num_par}\n" )
-    f.write( f"Number of runs for averaging: {num_averaging}\n" )
-print( f"Saved data in {dir_data}" )
+
+
+def mpes_command( par, seed=None ):
+    seed = [ "-s", str( seed ) ] if seed is not None else [ ]
+    seed += pre_cache
+    if parameter == "exponent":
+        return [ "python", "mPES.py", "--verbosity", str( 1 ), "-P", str( par ), "-N", str( neurons ), "-f",
+                 str( function ), "-D", str( dimensions ) ] \
+               + [ "-i" ] + inputs + calibrate_gain + seed
+    if parameter == "noise":
+        return [ "python", "mPES.py", "--verbosity", str( 1 ), "-n", str( par ), "-N", str( neurons ), "-f",
+                 str( function ), "-D", str( dimensions ) ] \
+               + [ "-i" ] + inputs + calibrate_gain + seed
+    if parameter == "neurons":
+        rounded_neurons = str( np.rint( par ).astype( int ) )
+        return [ "python", "mPES.py", "--verbosity", str( 1 ), "-N", str( 100 ), rounded_neurons, str( 100 ), "-N",
+                 str( neurons ), "-f", str( function ), "-D", str( dimensions ) ] \
+               + [ "-i" ] + inputs + calibrate_gain + seed
+    if parameter == "gain":
+        return [ "python", "mPES.py", "--verbosity", str( 1 ), "-g", str( par ), "-f", str( function ),
+                 "-D", str( dimensions ), "-N", str( neurons ) ] \
+               + [ "-i" ] + inputs + calibrate_gain + seed
+
+
+def parse_statistics( result ):
+    # mPES.py prints one list per line: MSE, Pearson, Spearman, Kendall, MSE-to-rho
+    lines = result.stdout.split( "\n" )
+
+    return [ np.mean( [ float( i ) for i in lines[ l ][ 1:-1 ].split( "," ) ] ) for l in range( 5 ) ]
+
+
+def run_job( job ):
+    result = run( mpes_command( job[ "par" ], job[ "seed" ] ), capture_output=True, universal_newlines=True )
+    try:
+        return parse_statistics( result )
+    except:
+        raise RuntimeError( f"mPES.py returned {result.returncode}: {result.stderr}" )
+
+
+def reserve_folder():
+    dir_name, dir_images, dir_data = make_timestamped_dir(
+            root=directory + "parameter_search/" + str( parameter ) + "/" )
+    print( "Reserved folder", dir_name )
+
+    return dir_name, dir_images, dir_data
+
+
+def pad_iterations( lists ):
+    # (parameters, averaging) array of per-parameter lists, NaN for the iterations that failed
+    return np.array( [ l + [ np.nan ] * (num_averaging - len( l )) for l in lists ] )
+
+
+def save_results( dir_name, dir_images, dir_data, mse_list, pearson_list, spearman_list, kendall_list, mse_to_rho_list ):
+    # every list is a (parameters, averaging) array, with NaN for the iterations that failed or did not finish
+    iterations = np.sum( ~np.isnan( mse_list ), axis=1 )
+    print( "Iterations for each parameter:", iterations, "of", num_averaging )
+    if np.any( iterations == 0 ):
+        print( "Warning: no results for parameters", res_list[ iterations == 0 ] )
+    with warnings.catch_warnings():
+        # parameters without any result average to NaN
+        warnings.simplefilter( "ignore", RuntimeWarning )
+        mse_means = np.nanmean( mse_list, axis=1 )
+        mse_stds = np.nanstd( mse_list, axis=1 )
+        pearson_means = np.nanmean( pearson_list, axis=1 )
+        spearman_means = np.nanmean( spearman_list, axis=1 )
+        kendall_means = np.nanmean( kendall_list, axis=1 )
+        mse_to_rho_means = np.nanmean( mse_to_rho_list, axis=1 )
+    print( "Average MSE for each parameter:", mse_means )
+    print( "Standard deviation of the MSE for each parameter:", mse_stds )
+    print( "Average Pearson for each parameter:", pearson_means )
+    print( "Average Spearman for each parameter:", spearman_means )
+    print( "Average Kendall for each parameter:", kendall_means )
+    print( "Average MSE-to-rho for each parameter:", mse_to_rho_means )
+
+    # rendered in the background while the results are written
+    figures = FigurePipeline()
+
+    fig = plt.figure()
+    ax = fig.add_subplot( 111 )
+    ax.plot( res_list, mse_means, label="MSE" )
+    ax.legend()
+    figures.save( fig, dir_images + "mse" + ".pdf" )
+
+    fig = plt.figure()
+    ax = fig.add_subplot( 111 )
+    ax.plot( res_list, pearson_means, label="Pearson" )
+    ax.plot( res_list, spearman_means, label="Spearman" )
+    ax.plot( res_list, kendall_means, label="Kendall" )
+    ax.legend()
+    figures.save( fig, dir_images + "correlations" + ".pdf" )
+
+    fig = plt.figure()
+    ax = fig.add_subplot( 111 )
+    ax.plot( res_list, mse_to_rho_means, label=r"$\frac{\rho}{\mathrm{MSE}}$" )
+    ax.legend()
+    figures.save( fig, dir_images + "mse-to-rho" + ".pdf" )
+
+
+    np.savetxt( dir_data + "results.csv",
+                np.stack( (res_list, mse_means, pearson_means, spearman_means, kendall_means, mse_to_rho_means,
+                           mse_stds, iterations), axis=1 ),
+                delimiter=",", header=parameter + ",MSE,Pearson,Spearman,Kendall,MSE-to-rho,MSE std,Iterations",
+                comments="" )
+    with open( dir_data + "parameters.txt", "w" ) as f:
+        f.write( f"Parameter: {parameter}\n" )
+        f.write( f"Function: {function}\n" )
+        f.write( f"Dimensions: {dimensions}\n" )
+        f.write( f"Neurons: {neurons}\n" )
+        f.write( f"Input: {inputs}\n" )
+        f.write( f"Limits: [{start_par},{end_par}]\n" )
+        f.write( f"Number of searched parameters: {num_par}\n" )
+        f.write( f"Number of runs for averaging: {num_averaging}\n" )
+        f.write( f"Calibrated gain: {bool( calibrate_gain )}\n" )
+    print( f"Saved data in {dir_data}" )
+    figures.wait()
+    print( f"Saved plots in {dir_images}" )
+
+    register_run( directory + "catalog.sqlite", __file__, directory=dir_name,
+                  config={ k: search.get( k ) for k in [ "parameter", "function", "dimensions", "neurons", "inputs",
+                                                     "limits", "number", "averaging", "calibrate_gain",
+                                                     "pre_cache" ] },
+                  metrics={ "best_mse": np.nanmin( mse_means ) },
+                  artifacts={ "images": dir_images, "results": dir_data + "results.csv" } )
+
+
+if args.role == "enqueue":
+    queue.set_meta( "search", search )
+    # the seed is fixed by the averaging index, as in the local role, so that a retried job reproduces the run it
+    # replaces
+    queue.enqueue( [ { "k": k, "par": float( par ), "seed": avg }
+                     for k, par in enumerate( res_list ) for avg in range( num_averaging ) ] )
+    print( f"Enqueued {num_parameters * num_averaging} jobs in {args.queue}" )
+
+if args.role == "worker":
+    completed = run_worker( queue, run_job, heartbeat_interval=args.heartbeat_timeout / 10, poll=True )
+    print( f"Worker finished after completing {completed} jobs, queue status: {queue.counts()}" )
+
+if args.role == "aggregate":
+    counts = queue.counts()
+    print( "Queue status:", counts )
+    if counts.get( "pending", 0 ) + counts.get( "running", 0 ) > 0:
+        print( "Warning: aggregating a search that has not finished yet" )
+    if counts.get( "failed", 0 ) > 0:
+        print( f"Warning: {counts[ 'failed' ]} jobs failed, their iterations are left out of the averages" )
+    # the seed of a job is its averaging index
+    statistics = gather_results( queue, (num_parameters, num_averaging, 5), lambda job: (job[ "k" ], job[ "seed" ]) )
+    save_results( *reserve_folder(), *np.moveaxis( statistics, -1, 0 ) )
+
+if args.role == "local":
+    dir_name, dir_images, dir_data = reserve_folder()
+
+    print( "Evaluation for", parameter, "with", neurons, "neurons" )
+    print( f"Search limits of parameters: [{start_par},{end_par}]" )
+    print( "Number of parameters:", num_parameters )
+    print( "Averaging per parameter", num_averaging )
+    print( "Total iterations", num_parameters * num_averaging )
+
+    mse_list = [ ]
+    pearson_list = [ ]
+    spearman_list = [ ]
+    kendall_list = [ ]
+    mse_to_rho_list = [ ]
+    counter = 0
+    for k, par in enumerate( res_list ):
+        print( f"Parameter #{k} ({par})" )
+        it_res_mse = [ ]
+        it_res_pearson = [ ]
+        it_res_spearman = [ ]
+        it_res_kendall = [ ]
+        it_res_mse_to_rho = [ ]
+        for avg in range( num_averaging ):
+            counter += 1
+            print( f"[{counter}/{num_parameters * num_averaging}] Averaging #{avg + 1}" )
+            # seeded by the averaging index as the jobs of a queue, so that both roles run the same search
+            result = run( mpes_command( par, avg ), capture_output=True, universal_newlines=True )
+            # save statistics
+            try:
+                mse, pearson, spearman, kendall, mse_to_rho = parse_statistics( result )
+                print( "MSE", mse )
+                it_res_mse.append( mse )
+                print( "Pearson", pearson )
+                it_res_pearson.append( pearson )
+                print( "Spearman", spearman )
+                it_res_spearman.append( spearman )
+                print( "Kendall", kendall )
+                it_res_kendall.append( kendall )
+                print( "MSE-to-rho", mse_to_rho )
+                it_res_mse_to_rho.append( mse_to_rho )
+            except:
+                print( "Ret", result.returncode )
+                print( "Out", result.stdout )
+                print( "Err", result.stderr )
+        mse_list.append( it_res_mse )
+        pearson_list.append( it_res_pearson )
+        spearman_list.append( it_res_spearman )
+        kendall_list.append( it_res_kendall )
+        mse_to_rho_list.append( it_res_mse_to_rho )
+
+    save_results( dir_name, dir_images, dir_data, *[ pad_iterations( l ) for l in
+                                                     [ mse_list, pearson_list, spearman_list, kendall_list,
+                                                       mse_to_rho_list ] ] )
@@ -1,11 +1,12 @@
-import pickle
 import time
 from functools import partial
 import os
-import xarray as xr
 from tabulate import tabulate
 
 from memristor_learning.Networks import *
+from memristor_arrays import MemristorArrayController
+from sweep_store import SweepSink
+from run_catalog import register_run
 
 # parameters to search
 start_r_0 = 1
@@ -29,25 +30,31 @@ dims = [ "exponent" ]
 coords = dict.fromkeys( dims, 0 )
 coords[ dims[ 0 ] ] = a_list
 
-data = [ ]
-results_dict = nested_dict( len( dims ), dict )
+# (k,) indices of the cells whose figures are generated and saved
+figure_cells = [ ]
 
+dir_name, dir_images = make_timestamped_dir( root="../data/parameter_search/mPlusMinus/" )
+# every finished cell is written to disk straight away, open it with sweep_store.load_sweep()
+sink = SweepSink( f"{dir_name}results.zarr", dims, coords, figure_cells=figure_cells, figures_directory=dir_images )
+
+best_mse = np.inf
 start_time = time.time()
 curr_iteration = 0
 
 for k, a in enumerate( a_list ):
-    net = SupervisedLearning( memristor_controller=MemristorArray,
+    net = SupervisedLearning( memristor_controller=MemristorArrayController,
                               memristor_model=
                               partial( MemristorPlusMinus, model=
                               partial( OnedirectionalPowerlawMemristor, a=a, r_0=1e2, r_1=2.5e8 ) ),
                               seed=0,
                               neurons=4,
                               verbose=False,
-                              generate_figures=False )
+                              generate_figures=sink.wants_figures( (k,) ) )
     res = net()
     print( res[ "mse" ] )
-    data.append( res[ "mse" ] )
-    results_dict[ a ] = res
+    best_mse = min( best_mse, res[ "mse" ] )
+    sink.write( (k,), res )
+    del res
     curr_iteration += 1
     print( f"{curr_iteration}/{total_iterations}:  {a}\n" )
 
@@ -55,10 +62,6 @@ for k, a in enumerate( a_list ):
 #     x[ "fig_pre_post" ].show()
 #     time.sleep( 2 )
 time_taken = time.time() - start_time
-dir_name, dir_images = make_timestamped_dir( root="../data/parameter_search/mPlusMinus/" )
-dataf = xr.DataArray( data=data, dims=dims, coords=coords, name="MSE" )
-with open( f"{dir_name}mse.pkl", "wb" ) as f:
-    pickle.dump( dataf, f )
 table = [ [ "exponent", start_a, end_a, num_a ],
           ]
 headers = [ "Parameter", "Start", "End", "Number" ]
@@ -67,4 +70,9 @@ with open( f"{dir_name}param.txt", "w+" ) as f:
     f.write( f"\n\nTotal time: {datetime.timedelta( seconds=time_taken )}" )
     f.write( f"\nTime per iteration: {round( time_taken / total_iterations, 2 )} s" )
     
-    # loaded = pickle.load( open( f"{dir_name}mse.pkl", "rb" ) )
+    # loaded = load_sweep( f"{dir_name}results.zarr", "mse" )
+
+register_run( "../data/catalog.sqlite", __file__, directory=dir_name,
+              config={ "exponent": [ start_a, end_a, num_a ] },
+              metrics={ "best_mse": best_mse },
+              artifacts={ "results": f"{dir_name}results.zarr", "images": dir_images } )
@@ -1,8 +1,36 @@
+import argparse
+
 import seaborn as sb
 import xarray as xr
 from matplotlib import pyplot as plt
-import pickle
 
-dataset = pickle.load( open( "../remote_data/data/22-04-2020_04-09/mse.pkl", "rb" ) )
+from run_catalog import RunCatalog
+from sweep_store import load_sweep
+
+parser = argparse.ArgumentParser( description="Plot the results of a parameter search" )
+parser.add_argument( "path", nargs="?", default=None,
+                     help="Sweep to plot, e.g. ../remote_data/data/22-04-2020_04-09/mse.pkl (default: the results of "
+                          "the latest --script run in the catalog)" )
+parser.add_argument( "-c", "--catalog", default="../data/catalog.sqlite" )
+parser.add_argument( "--script", default="parameter_search_mPlusMinus.py" )
+parser.add_argument( "-v", "--variable", default=None, help="Metric to plot (default: mse, or the only one saved)" )
+args = parser.parse_args()
+
+path = args.path
+variable = args.variable
+if path is None:
+    runs = [ run for run in RunCatalog( args.catalog ).query( script=args.script ) if "results" in run[ "artifacts" ] ]
+    if not runs:
+        parser.error( f"No run of {args.script} with saved results in {args.catalog}" )
+    path = runs[ -1 ][ "artifacts" ][ "results" ]
+    variable = variable or "mse"
+    print( f"Plotting {path} of run #{runs[ -1 ][ 'id' ]} ({runs[ -1 ][ 'directory' ]})" )
+
+# opened lazily, only the chunks needed by each facet are read (a pickle is converted to mse.zarr the first time)
+dataset = load_sweep( path, variable )
 
-dataset.plot( x="r_0", y="r_1", col="exponent", col_wrap=3 )
+if { "r_0", "r_1", "exponent" } <= set( dataset.dims ):
+    dataset.plot( x="r_0", y="r_1", col="exponent", col_wrap=3 )
+else:
+    dataset.plot()
+plt.show()
@@ -0,0 +1,97 @@
+import json
+import os
+
+import numpy as np
+
+
+# Append-only, memory-mapped storage of probe data for long simulations run in chunks.
+# After every chunk the data collected by the probes is appended to one raw file per probe and cleared from the
+# simulator, so that memory only ever holds one chunk; afterwards the files are read back as lazy memory-mapped arrays
+# that can be used wherever sim.data[ probe ] was.
+
+def _period( sim, probe ):
+    sample_every = probe.sample_every if probe.sample_every is not None else sim.dt
+
+    return max( int( np.round( sample_every / sim.dt ) ), 1 )
+
+
+def clear_probes( sim, probes ):
+    # frees the data collected by the given probes only; the core simulator caches the arrays of sim.data by their
+    # length, so the cache is reset as well or the next chunk of the same length would read this one again
+    for probe in probes:
+        sim.model.params[ probe ] = [ ]
+    if hasattr( sim.data, "reset" ):
+        sim.data.reset()
+
+
+class ProbeStore:
+    def __init__( self, directory, probes ):
+        # probes: { name: nengo.Probe }
+        self.directory = directory
+        self.probes = probes
+        os.makedirs( directory, exist_ok=True )
+        self.index = { name: { "file": name + ".bin", "dtype": None, "shape": None, "rows": 0 } for name in probes }
+        index_path = os.path.join( directory, "probes.json" )
+        if os.path.exists( index_path ):
+            with open( index_path ) as f:
+                self.index.update( json.load( f ) )
+
+    def _write_index( self ):
+        with open( os.path.join( self.directory, "probes.json" ), "w" ) as f:
+            json.dump( self.index, f, indent=2 )
+
+    def flush( self, sim ):
+        # appends what the probes collected since the last flush and frees it in the simulator
+        for name, probe in self.probes.items():
+            data = np.asarray( sim.data[ probe ] )
+            if data.shape[ 0 ] == 0:
+                continue
+            entry = self.index[ name ]
+            entry[ "dtype" ] = data.dtype.str
+            entry[ "shape" ] = list( data.shape[ 1: ] )
+            with open( os.path.join( self.directory, entry[ "file" ] ), "ab" ) as f:
+                f.write( np.ascontiguousarray( data ).tobytes() )
+            entry[ "rows" ] += data.shape[ 0 ]
+        self._write_index()
+
+        clear_probes( sim, self.probes.values() )
+
+    def truncate( self, sim ):
+        # drops what was written after the state the simulator was restored to (e.g. from a checkpoint)
+        for name, probe in self.probes.items():
+            entry = self.index[ name ]
+            rows = min( entry[ "rows" ], sim.n_steps // _period( sim, probe ) )
+            if entry[ "dtype" ] is not None:
+                row_size = np.dtype( entry[ "dtype" ] ).itemsize * int( np.prod( entry[ "shape" ] ) )
+                with open( os.path.join( self.directory, entry[ "file" ] ), "ab" ) as f:
+                    f.truncate( rows * row_size )
+            entry[ "rows" ] = rows
+        self._write_index()
+
+    def __getitem__( self, probe ):
+        # lazy array of all the data of a probe, indexed by the probe object like sim.data
+        for name, p in self.probes.items():
+            if p is probe:
+                return self.load( name )
+        raise KeyError( probe )
+
+    def load( self, name ):
+        return open_probe( self.directory, name, self.index[ name ] )
+
+
+def open_probe( directory, name, entry=None ):
+    if entry is None:
+        with open( os.path.join( directory, "probes.json" ) ) as f:
+            entry = json.load( f )[ name ]
+    if entry[ "rows" ] == 0:
+        return np.zeros( (0,) + tuple( entry[ "shape" ] or () ) )
+
+    return np.memmap( os.path.join( directory, entry[ "file" ] ), dtype=np.dtype( entry[ "dtype" ] ), mode="r",
+                      shape=(entry[ "rows" ],) + tuple( entry[ "shape" ] ) )
+
+
+def open_probes( directory ):
+    with open( os.path.join( directory, "probes.json" ) ) as f:
+        index = json.load( f )
+
+    return { name: open_probe( directory, name, entry ) for name, entry in index.items() }
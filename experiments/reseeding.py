@@ -0,0 +1,110 @@
+import warnings
+
+import nengo
+import nengo_dl
+import numpy as np
+from nengo.processes import Process
+
+
+# Build a NengoDL simulator once per model structure and re-initialise only its seed-dependent parts between runs.
+# The network for the new seed is built with the NumPy builder only (no TensorFlow graph), then the initial values of
+# its signals (encoders, biases, connection weights, learning rule state such as the memristor resistances) are
+# written into the variables of the existing simulator, and the output of every input Node driven by a Process (e.g.
+# WhiteSignal) is fed in as data.  If the simulator does not expose the variables that are needed, or the new network
+# does not have the same structure, copy_parameters raises a ValueError and the model is rebuilt, with a warning the
+# first time.
+
+def _objects( network ):
+    ensembles = network.all_ensembles
+    connections = network.all_connections
+
+    return ensembles \
+           + [ e.neurons for e in ensembles ] \
+           + network.all_nodes \
+           + connections \
+           + [ c.learning_rule for c in connections if c.learning_rule is not None ]
+
+
+def _assign( sim, signal, value ):
+    try:
+        tensor_graph = sim.tensor_graph
+        tensor_signal = tensor_graph.signals.sig_map[ signal ]
+        if tensor_signal.key in tensor_graph.base_params:
+            var = tensor_graph.base_params[ tensor_signal.key ]
+        else:
+            var = tensor_graph.saved_state[ tensor_signal.key ]
+    except (AttributeError, KeyError) as e:
+        # this version of NengoDL keeps the signal somewhere else
+        raise ValueError( f"No simulator variable holds {signal} ({e!r})" ) from e
+
+    rows = np.concatenate( [ np.arange( start, stop ) for start, stop in tensor_signal.slices ] )
+    current = var.numpy()
+    if current.ndim == np.ndim( value ) + 1 and current.shape[ 0 ] == sim.minibatch_size and \
+            current.shape[ 1 ] != len( rows ):
+        # minibatched state, same value for every item in the minibatch
+        current[ :, rows ] = np.reshape( value, (len( rows ),) + current.shape[ 2: ] )
+    else:
+        current[ rows ] = np.reshape( value, (len( rows ),) + current.shape[ 1: ] )
+    var.assign( current )
+
+
+def copy_parameters( sim, network, new_network ):
+    built = nengo.builder.Model( dt=sim.dt, builder=nengo_dl.builder.NengoBuilder() )
+    built.build( new_network )
+
+    old_objects = _objects( network )
+    new_objects = _objects( new_network )
+    if len( old_objects ) != len( new_objects ):
+        raise ValueError( "The two networks do not have the same structure" )
+    for old, new in zip( old_objects, new_objects ):
+        for key, new_signal in built.sig[ new ].items():
+            old_signal = sim.model.sig[ old ].get( key )
+            if old_signal is None or new_signal is None:
+                continue
+            if old_signal.shape != new_signal.shape:
+                raise ValueError( f"Signal {key} of {old} changed shape" )
+            if np.array_equal( old_signal.initial_value, new_signal.initial_value ):
+                continue
+            _assign( sim, old_signal, new_signal.initial_value )
+
+
+class ReseedableSimulator:
+    def __init__( self, build_model, seed, **simulator_kwargs ):
+        self.build_model = build_model
+        self.simulator_kwargs = simulator_kwargs
+        self.network = build_model( seed )
+        self.current = self.network
+        self.sim = nengo_dl.Simulator( self.network, **simulator_kwargs )
+        self.seed = seed
+        self.rebuilt = 0
+
+    def reseed( self, seed ):
+        # returns the network whose probes have to be used to read the simulator data
+        self.sim.reset( include_probe_data=True, include_trainable=True, include_processes=True )
+        if seed != self.seed:
+            self.current = self.build_model( seed )
+            try:
+                copy_parameters( self.sim, self.network, self.current )
+            except ValueError as e:
+                if not self.rebuilt:
+                    warnings.warn( f"Could not re-seed the simulator in place ({e}), rebuilding it" )
+                self.rebuilt += 1
+                self.sim.close()
+                self.network = self.current
+                self.sim = nengo_dl.Simulator( self.network, **self.simulator_kwargs )
+            self.seed = seed
+
+        return self.network
+
+    def run( self, time_in_seconds ):
+        # inputs generated by processes are fed from the network built with the current seed
+        n_steps = int( np.round( float( time_in_seconds ) / self.sim.dt ) )
+        data = { }
+        for node, current_node in zip( self.network.all_nodes, self.current.all_nodes ):
+            if isinstance( current_node.output, Process ) and current_node.size_in == 0:
+                trace = current_node.output.run_steps( self.sim.n_steps + n_steps, dt=self.sim.dt )
+                data[ node ] = np.tile( trace[ self.sim.n_steps: ][ None ], (self.sim.minibatch_size, 1, 1) )
+        self.sim.run_steps( n_steps, data=data )
+
+    def close( self ):
+        self.sim.close()
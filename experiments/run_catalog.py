@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+
+# Catalog of every experiment run: configuration, metrics and the paths of the files it produced are registered in
+# a single SQLite database so that runs can be found by configuration without walking and parsing the timestamped
+# data folders.
+
+ALIASES = { "D": "dimensions", "N": "neurons", "S": "simulation_time", "g": "gain", "l": "learning_rule",
+            "f": "function", "s": "seed", "E": "experiment" }
+
+
+def _scalar( value ):
+    # single-element lists (e.g. -N 100) are stored as scalars so that they can be compared
+    if isinstance( value, (list, tuple, np.ndarray) ) and len( value ) == 1:
+        value = value[ 0 ]
+    if isinstance( value, np.generic ):
+        value = value.item()
+    if value is None or isinstance( value, (bool, int, float, str) ):
+        return value
+
+    return json.dumps( value, default=str )
+
+
+def _parse( value ):
+    for cast in (int, float):
+        try:
+            return cast( value )
+        except ValueError:
+            pass
+
+    return value
+
+
+class RunCatalog:
+    def __init__( self, path ):
+        self.path = path
+        os.makedirs( os.path.dirname( os.path.abspath( path ) ), exist_ok=True )
+
+        with self._connect() as connection:
+            connection.executescript( """
+                CREATE TABLE IF NOT EXISTS runs ( id INTEGER PRIMARY KEY, script TEXT NOT NULL, directory TEXT,
+                                                  timestamp REAL NOT NULL, config TEXT NOT NULL );
+                CREATE TABLE IF NOT EXISTS config ( run_id INTEGER NOT NULL REFERENCES runs ( id ), key TEXT NOT NULL,
+                                                    value );
+                CREATE TABLE IF NOT EXISTS metrics ( run_id INTEGER NOT NULL REFERENCES runs ( id ),
+                                                     name TEXT NOT NULL, value REAL, raw TEXT );
+                CREATE TABLE IF NOT EXISTS artifacts ( run_id INTEGER NOT NULL REFERENCES runs ( id ),
+                                                       kind TEXT NOT NULL, path TEXT NOT NULL );
+                CREATE INDEX IF NOT EXISTS runs_script ON runs ( script, timestamp );
+                CREATE INDEX IF NOT EXISTS config_key_value ON config ( key, value, run_id );
+                CREATE INDEX IF NOT EXISTS config_run ON config ( run_id );
+                CREATE INDEX IF NOT EXISTS metrics_name_value ON metrics ( name, value, run_id );
+                CREATE INDEX IF NOT EXISTS metrics_run ON metrics ( run_id );
+                CREATE INDEX IF NOT EXISTS artifacts_run ON artifacts ( run_id );
+                """ )
+
+    def _connect( self ):
+        return sqlite3.connect( self.path, timeout=60 )
+
+    def register( self, script, directory=None, config=None, metrics=None, artifacts=None ):
+        config = config or { }
+        metrics = metrics or { }
+        artifacts = artifacts or { }
+
+        with self._connect() as connection:
+            cursor = connection.execute( "INSERT INTO runs ( script, directory, timestamp, config ) VALUES ( ?, ?, ?, ? )",
+                                         (os.path.basename( script ), directory, time.time(),
+                                          json.dumps( config, default=str )) )
+            run_id = cursor.lastrowid
+            connection.executemany( "INSERT INTO config VALUES ( ?, ?, ? )",
+                                    [ (run_id, k, _scalar( v )) for k, v in config.items() ] )
+            # per-dimension metrics are summarised by their mean, the raw values are kept alongside
+            connection.executemany( "INSERT INTO metrics VALUES ( ?, ?, ?, ? )",
+                                    [ (run_id, k, float( np.mean( v ) ), json.dumps( np.asarray( v ).tolist() ))
+                                      for k, v in metrics.items() ] )
+            connection.executemany( "INSERT INTO artifacts VALUES ( ?, ?, ? )",
+                                    [ (run_id, k, p) for k, p in artifacts.items() ] )
+
+        return run_id
+
+    def query( self, script=None, metrics=None, **config ):
+        # config and metrics filters are equality and (min, max) range filters respectively
+        clauses = [ ]
+        parameters = [ ]
+        if script is not None:
+            clauses.append( "script = ?" )
+            parameters.append( os.path.basename( script ) )
+        for key, value in config.items():
+            clauses.append( "id IN ( SELECT run_id FROM config WHERE key = ? AND value = ? )" )
+            parameters += [ ALIASES.get( key, key ), _scalar( value ) ]
+        for name, (low, high) in (metrics or { }).items():
+            clauses.append( "id IN ( SELECT run_id FROM metrics WHERE name = ? AND value BETWEEN ? AND ? )" )
+            parameters += [ name, low, high ]
+        where = " WHERE " + " AND ".join( clauses ) if clauses else ""
+
+        with self._connect() as connection:
+            rows = connection.execute( "SELECT id, script, directory, timestamp, config FROM runs" + where +
+                                       " ORDER BY timestamp", parameters ).fetchall()
+            runs = [ ]
+            for run_id, script_name, directory, timestamp, run_config in rows:
+                runs.append( {
+                        "id"       : run_id,
+                        "script"   : script_name,
+                        "directory": directory,
+                        "timestamp": timestamp,
+                        "config"   : json.loads( run_config ),
+                        "metrics"  : dict( connection.execute( "SELECT name, value FROM metrics WHERE run_id = ?",
+                                                               (run_id,) ).fetchall() ),
+                        "artifacts": dict( connection.execute( "SELECT kind, path FROM artifacts WHERE run_id = ?",
+                                                               (run_id,) ).fetchall() )
+                        } )
+
+        return runs
+
+
+def register_run( catalog, script, directory=None, config=None, metrics=None, artifacts=None ):
+    return RunCatalog( catalog ).register( script, directory=directory, config=config, metrics=metrics,
+                                           artifacts=artifacts )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser( description="Query the catalog of experiment runs" )
+    parser.add_argument( "-c", "--catalog", default="../data/catalog.sqlite" )
+    parser.add_argument( "--script", default=None, help="e.g. mPES.py" )
+    parser.add_argument( "-w", "--where", nargs="*", default=[ ],
+                         help="Configuration filters as key=value, e.g. D=3 N=100 gain=1e4" )
+    parser.add_argument( "-m", "--metric", nargs=3, action="append", default=[ ], metavar=("NAME", "MIN", "MAX"),
+                         help="Only runs whose metric lies in [MIN, MAX]" )
+    parser.add_argument( "--csv", action="store_true", help="Print the runs as CSV" )
+    args = parser.parse_args()
+
+    runs = RunCatalog( args.catalog ).query(
+            script=args.script,
+            metrics={ name: (float( low ), float( high )) for name, low, high in args.metric },
+            **{ k: _parse( v ) for k, v in (w.split( "=", 1 ) for w in args.where) } )
+
+    metric_names = sorted( { name for run in runs for name in run[ "metrics" ] } )
+    if args.csv:
+        print( ",".join( [ "id", "script", "directory", "timestamp" ] + metric_names ) )
+        for run in runs:
+            print( ",".join( [ str( run[ "id" ] ), run[ "script" ], str( run[ "directory" ] ),
+                               time.strftime( "%d-%m-%Y_%H-%M-%S", time.localtime( run[ "timestamp" ] ) ) ]
+                             + [ str( run[ "metrics" ].get( m, "" ) ) for m in metric_names ] ) )
+    else:
+        for run in runs:
+            print( f"#{run[ 'id' ]} {run[ 'script' ]} "
+                   f"{time.strftime( '%d-%m-%Y %H:%M:%S', time.localtime( run[ 'timestamp' ] ) )} "
+                   f"{run[ 'directory' ] or ''}" )
+            print( "    config:", run[ "config" ] )
+            if run[ "metrics" ]:
+                print( "    metrics:", run[ "metrics" ] )
+            if run[ "artifacts" ]:
+                print( "    artifacts:", run[ "artifacts" ] )
+        print( f"{len( runs )} runs" )
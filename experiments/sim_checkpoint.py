@@ -0,0 +1,89 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+
+# Checkpoints of a running Nengo or NengoDL simulator, so that long simulations run in chunks can be resumed.
+# A checkpoint holds the complete simulator state (neuron voltages and refractory times, synapse states, memristor
+# resistances and every other non-constant signal), the step counter, the RNG state and the probe data collected so
+# far.  NengoDL simulators save their state with save_params( include_state=True ), Nengo core simulators have their
+# signals saved in the order in which the simulator created them, which is only reproducible when the simulator is
+# built with optimize=False (the operator merging of the optimiser depends on the order of Python sets).
+# Random state hidden inside the closures of processes (e.g. WhiteNoise) cannot be saved, models using such processes
+# are only resumed statistically, not bit-exactly.
+# State kept outside the simulator (e.g. accumulators updated by Node functions) can be saved alongside as extra arrays.
+
+def _is_nengo_dl( sim ):
+    return hasattr( sim, "tensor_graph" )
+
+
+def _signal_shapes( sim ):
+    return [ ] if _is_nengo_dl( sim ) else [ list( signal.shape ) for signal in sim.signals ]
+
+
+def save_checkpoint( sim, path, metadata=None, extra=None ):
+    # written to a temporary folder that replaces the previous checkpoint only once complete
+    temporary = path.rstrip( "/" ) + ".tmp"
+    shutil.rmtree( temporary, ignore_errors=True )
+    os.makedirs( temporary )
+
+    # Nengo core keeps one entry per sample, NengoDL one (minibatch, steps, ...) block per run
+    arrays = { "extra_" + name: value for name, value in (extra or { }).items() }
+    probe_chunks = [ ]
+    for i, probe in enumerate( sim.model.probes ):
+        data = sim.model.params[ probe ]
+        chunks = data if _is_nengo_dl( sim ) else ([ np.asarray( data ) ] if len( data ) > 0 else [ ])
+        for j, chunk in enumerate( chunks ):
+            arrays[ f"probe_{i}_{j}" ] = chunk
+        probe_chunks.append( len( chunks ) )
+    if _is_nengo_dl( sim ):
+        sim.save_params( os.path.join( temporary, "params" ), include_state=True )
+    else:
+        for i, (signal, value) in enumerate( sim.signals.items() ):
+            if not signal.readonly:
+                arrays[ f"signal_{i}" ] = value
+        rng_state = sim.rng.get_state()
+        arrays[ "rng_keys" ] = rng_state[ 1 ]
+        metadata = dict( metadata or { }, rng=[ rng_state[ 0 ], None, *rng_state[ 2: ] ] )
+    np.savez( os.path.join( temporary, "state.npz" ), **arrays )
+
+    with open( os.path.join( temporary, "checkpoint.json" ), "w" ) as f:
+        json.dump( dict( metadata or { }, n_steps=int( sim.n_steps ), time=float( sim.time ),
+                         probe_chunks=probe_chunks, signal_shapes=_signal_shapes( sim ) ),
+                   f, indent=2, default=str )
+
+    shutil.rmtree( path, ignore_errors=True )
+    os.replace( temporary, path )
+
+
+def load_checkpoint( sim, path ):
+    # restores the state saved by save_checkpoint into a simulator built from the same model, returns its metadata
+    # with the extra arrays under "extra"
+    with open( os.path.join( path, "checkpoint.json" ) ) as f:
+        metadata = json.load( f )
+    if len( metadata[ "probe_chunks" ] ) != len( sim.model.probes ):
+        raise ValueError( f"The checkpoint in {path} was saved from a different model" )
+    arrays = np.load( os.path.join( path, "state.npz" ) )
+
+    if _is_nengo_dl( sim ):
+        sim.load_params( os.path.join( path, "params" ), include_state=True )
+    else:
+        if metadata[ "signal_shapes" ] != _signal_shapes( sim ):
+            raise ValueError( f"The checkpoint in {path} was saved from a different model" )
+        for i, (signal, value) in enumerate( sim.signals.items() ):
+            if not signal.readonly:
+                value[ ... ] = arrays[ f"signal_{i}" ]
+        rng = metadata[ "rng" ]
+        sim.rng.set_state( (rng[ 0 ], arrays[ "rng_keys" ], *rng[ 2: ]) )
+
+    for i, (probe, n_chunks) in enumerate( zip( sim.model.probes, metadata[ "probe_chunks" ] ) ):
+        chunks = [ arrays[ f"probe_{i}_{j}" ] for j in range( n_chunks ) ]
+        sim.model.params[ probe ] = chunks if _is_nengo_dl( sim ) or n_chunks == 0 else list( chunks[ 0 ] )
+    sim._n_steps = metadata[ "n_steps" ]
+    sim._time = metadata[ "time" ]
+    metadata[ "extra" ] = { name[ len( "extra_" ): ]: arrays[ name ] for name in arrays.files
+                            if name.startswith( "extra_" ) }
+
+    return metadata
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import nengo
+import numpy as np
+from nengo.dists import Choice
+from nengo.params import StringParam
+
+
+# Compact storage of spike trains as event lists and replay of recorded trains in later simulations.
+# The events are kept in CSR form: indices.bin holds the index of the neuron of every spike, memory-mapped and
+# appended to during the recording, and indptr.npy the offset of the first event of every timestep.
+# A recording is written in a temporary folder next to its destination and moved there in one rename when it is
+# complete, so that concurrent runs sharing a cache never read or truncate each other's files.
+# A population can be replayed with ReplayLIF: it keeps the tuning curves of the LIF neurons it recorded, so encoders
+# and decoders are solved exactly as before, but its output is read from the recording instead of being simulated.
+# Recordings also replace dense probes of neuron output: rasters and rates are computed straight from the events and
+# dense() gives back what a probe (with the same sample_every) would have recorded.
+
+def cache_path( directory, config ):
+    # folder of the recording made with the given configuration
+    key = hashlib.sha256( json.dumps( config, sort_keys=True, default=str ).encode() ).hexdigest()
+
+    return os.path.join( directory, key ) + "/"
+
+
+def is_recorded( path ):
+    # only published recordings have events.json
+    return os.path.exists( os.path.join( path, "events.json" ) )
+
+
+class SpikeRecorder:
+    # step function of a Node receiving the spikes of a population (connected with synapse=None)
+    def __init__( self, path, n_neurons, dt, amplitude=1 ):
+        self.path = path
+        self.n_neurons = n_neurons
+        self.dt = dt
+        self.amplitude = amplitude
+        destination = os.path.normpath( path )
+        os.makedirs( os.path.dirname( destination ), exist_ok=True )
+        self.directory = tempfile.mkdtemp( prefix=os.path.basename( destination ) + ".", suffix=".tmp",
+                                           dir=os.path.dirname( destination ) )
+        self.indices = open( os.path.join( self.directory, "indices.bin" ), "wb" )
+        self.indptr = [ 0 ]
+
+    def step( self, t, x ):
+        # Nengo calls the function once at build time with t=0 to find the size of its output
+        if t <= 0:
+            return
+        # several spikes of the same neuron in a timestep are stored as repeated events
+        counts = np.rint( x * self.dt / self.amplitude ).astype( np.int64 )
+        events = np.repeat( np.arange( self.n_neurons, dtype=np.int32 ), counts )
+        self.indices.write( events.tobytes() )
+        self.indptr.append( self.indptr[ -1 ] + len( events ) )
+
+    def close( self ):
+        self.indices.close()
+        np.save( os.path.join( self.directory, "indptr.npy" ), np.array( self.indptr, dtype=np.int64 ) )
+        with open( os.path.join( self.directory, "events.json" ), "w" ) as f:
+            json.dump( { "n_neurons": self.n_neurons, "n_steps": len( self.indptr ) - 1, "dt": self.dt,
+                         "amplitude": self.amplitude }, f, indent=2 )
+        self._publish()
+
+    def _publish( self ):
+        destination = os.path.normpath( self.path )
+        if is_recorded( destination ):
+            # another run with the same configuration published first, its recording is kept
+            shutil.rmtree( self.directory )
+            return
+        if os.path.exists( destination ):
+            # left over by a run that did not finish
+            shutil.rmtree( destination, ignore_errors=True )
+        try:
+            os.replace( self.directory, destination )
+        except OSError:
+            # another run published in the meantime
+            if not is_recorded( destination ):
+                raise
+            shutil.rmtree( self.directory )
+
+
+class SpikeEvents:
+    def __init__( self, path ):
+        with open( os.path.join( path, "events.json" ) ) as f:
+            meta = json.load( f )
+        self.n_neurons = meta[ "n_neurons" ]
+        self.n_steps = meta[ "n_steps" ]
+        self.dt = meta[ "dt" ]
+        self.amplitude = meta[ "amplitude" ]
+        self.indptr = np.load( os.path.join( path, "indptr.npy" ) )
+        self.indices = np.memmap( os.path.join( path, "indices.bin" ), dtype=np.int32, mode="r" ) \
+            if self.indptr[ -1 ] > 0 else np.zeros( 0, dtype=np.int32 )
+
+    def spikes( self, step ):
+        # dense output of the population at the given timestep (0-based)
+        if step >= self.n_steps:
+            raise IndexError( f"Only {self.n_steps} timesteps were recorded" )
+        events = self.indices[ self.indptr[ step ]:self.indptr[ step + 1 ] ]
+
+        return np.bincount( events, minlength=self.n_neurons ) * (self.amplitude / self.dt)
+
+    def events( self, start=0, stop=None ):
+        # (timestep, neuron) of every spike in [start, stop)
+        stop = self.n_steps if stop is None else stop
+        steps = np.repeat( np.arange( start, stop ), np.diff( self.indptr[ start:stop + 1 ] ) )
+
+        return steps, np.asarray( self.indices[ self.indptr[ start ]:self.indptr[ stop ] ] )
+
+    def dense( self, start=0, stop=None, period=1 ):
+        # output of the population at every period-th timestep, as a probe with sample_every = period * dt
+        stop = self.n_steps if stop is None else stop
+        steps, neurons = self.events( start, stop )
+        # timestep k is recorded as sample (k + 1) / period - 1
+        sampled = (steps + 1) % period == 0
+        output = np.zeros( (stop // period - start // period, self.n_neurons) )
+        np.add.at( output, ((steps[ sampled ] + 1) // period - 1 - start // period, neurons[ sampled ]),
+                   self.amplitude / self.dt )
+
+        return output
+
+    def rates( self, bin_width=0.01 ):
+        # firing rate of every neuron in consecutive bins of bin_width seconds
+        bin_steps = max( int( np.round( bin_width / self.dt ) ), 1 )
+        steps, neurons = self.events()
+        counts = np.zeros( (int( np.ceil( self.n_steps / bin_steps ) ), self.n_neurons) )
+        np.add.at( counts, (steps // bin_steps, neurons), 1 )
+
+        return counts / (bin_steps * self.dt)
+
+
+def plot_spike_raster( events, decoded=None, decoded_time=None, title="Post", plot_size=(13, 7), dpi=300 ):
+    # raster of the recorded spikes, under the decoded output of the population if given
+    import matplotlib.pyplot as plt
+
+    steps, neurons = events.events()
+    if decoded is not None:
+        fig, (ax_decoded, ax_raster) = plt.subplots( 2, 1, sharex=True, figsize=plot_size, dpi=dpi,
+                                                     gridspec_kw={ "height_ratios": [ 1, 2 ] } )
+        ax_decoded.plot( decoded_time, decoded )
+        ax_decoded.set_title( f"{title} decoded output" )
+    else:
+        fig, ax_raster = plt.subplots( figsize=plot_size, dpi=dpi )
+    ax_raster.scatter( (steps + 1) * events.dt, neurons, marker="|", s=20, c="k", linewidths=0.5 )
+    ax_raster.set_ylim( -0.5, events.n_neurons - 0.5 )
+    ax_raster.set_ylabel( "Neuron" )
+    ax_raster.set_xlabel( "Time (s)" )
+    ax_raster.set_title( f"{title} spikes" )
+
+    return fig
+
+
+_recordings = { }
+
+
+class ReplayLIF( nengo.LIF ):
+    # LIF tuning curves, recorded spikes; the replayed timestep is kept as neuron state so that it is reset with the
+    # simulator
+    state = dict( nengo.LIF.state, replay_step=Choice( [ 0 ] ) )
+
+    path = StringParam( "path" )
+
+    def __init__( self, path, tau_rc=0.02, tau_ref=0.002, min_voltage=0, amplitude=1 ):
+        super().__init__( tau_rc=tau_rc, tau_ref=tau_ref, min_voltage=min_voltage, amplitude=amplitude )
+        self.path = path
+
+    def step( self, dt, J, output, voltage, refractory_time, replay_step ):
+        if self.path not in _recordings:
+            _recordings[ self.path ] = SpikeEvents( self.path )
+        output[ ... ] = _recordings[ self.path ].spikes( int( replay_step[ 0 ] ) )
+        replay_step[ ... ] += 1
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+
+
+# Running mean and confidence interval of per-block errors (Welford's algorithm), and an append-only log of the
+# per-iteration errors from which they can be rebuilt after an interruption.
+
+class StreamingStatistics:
+    def __init__( self ):
+        self.n = 0
+        self.mean = None
+        self.m2 = None
+
+    def update( self, x ):
+        x = np.asarray( x, dtype=float )
+        if self.n == 0:
+            self.mean = np.zeros_like( x )
+            self.m2 = np.zeros_like( x )
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    def std( self ):
+        # population standard deviation, as np.std
+        return np.sqrt( self.m2 / self.n )
+
+    def ci( self, confidence=0.95 ):
+        # mean and bounds of the confidence interval
+        from scipy.stats import norm
+
+        z = norm.ppf( (1 + confidence) / 2 )
+
+        return self.mean, \
+               self.mean + z * self.std() / np.sqrt( self.n ), \
+               self.mean - z * self.std() / np.sqrt( self.n )
+
+
+def append_row( path, index, values ):
+    # one line per finished iteration: its index followed by its values, flushed to disk straight away
+    with open( path, "a" ) as f:
+        np.savetxt( f, np.concatenate( ([ index ], np.ravel( values )) )[ None ], delimiter="," )
+        f.flush()
+        os.fsync( f.fileno() )
+
+
+def read_rows( path ):
+    # the rows of the finished iterations; a last line left incomplete by an interrupted write (no newline, a cut
+    # number or fewer values than the rows before it) is cut off the file, so that the next rows start on a new line
+    if not os.path.exists( path ):
+        return { }
+    rows = { }
+    columns = None
+    complete = 0
+    with open( path, "rb+" ) as f:
+        for line in f:
+            if not line.endswith( b"\n" ):
+                break
+            try:
+                row = np.array( line.decode().split( "," ), dtype=float )
+            except ValueError:
+                break
+            if columns is not None and len( row ) != columns:
+                break
+            columns = len( row )
+            rows[ int( row[ 0 ] ) ] = row[ 1: ]
+            complete += len( line )
+        if complete < f.seek( 0, os.SEEK_END ):
+            print( f"Dropped the incomplete last row of {path}" )
+            f.truncate( complete )
+
+    return rows
@@ -0,0 +1,105 @@
+import numbers
+import os
+
+import matplotlib.pyplot as plt
+import numpy as np
+import zarr
+
+
+# On-disk sink for grid searches: every finished cell writes its scalar metrics straight into a chunked Zarr store
+# that follows the xarray conventions, so the store can be opened (also while the sweep is still running) with
+# open_sweep().  Nothing apart from the current cell is kept in memory.
+
+def _is_scalar( value ):
+    return isinstance( value, numbers.Number ) or (isinstance( value, np.ndarray ) and value.ndim == 0)
+
+
+class SweepSink:
+    def __init__( self, path, dims, coords, figure_cells=(), figures_directory=None, chunks=None ):
+        self.path = path
+        self.dims = list( dims )
+        self.shape = tuple( len( coords[ d ] ) for d in self.dims )
+        self.chunks = chunks if chunks is not None else tuple( min( s, 64 ) for s in self.shape )
+        self.figure_cells = set( tuple( c ) for c in figure_cells )
+        self.figures_directory = figures_directory
+
+        self.group = zarr.open_group( path, mode="a" )
+        for d in self.dims:
+            if d not in self.group:
+                coord = self.group.array( d, np.asarray( coords[ d ] ), chunks=(len( coords[ d ] ),) )
+                coord.attrs[ "_ARRAY_DIMENSIONS" ] = [ d ]
+        self.done = self._variable( "done", dtype=bool, fill_value=False )
+
+    def _variable( self, name, dtype=np.float64, fill_value=np.nan ):
+        if name not in self.group:
+            var = self.group.full( name, fill_value=fill_value, shape=self.shape, chunks=self.chunks, dtype=dtype )
+            var.attrs[ "_ARRAY_DIMENSIONS" ] = self.dims
+            zarr.consolidate_metadata( self.group.store )
+
+        return self.group[ name ]
+
+    def wants_figures( self, index ):
+        return tuple( index ) in self.figure_cells
+
+    def write( self, index, res ):
+        index = tuple( index )
+        for key, value in res.items():
+            if _is_scalar( value ):
+                self._variable( key )[ index ] = value
+            elif hasattr( value, "savefig" ) and self.wants_figures( index ):
+                value.savefig( os.path.join( self.figures_directory,
+                                             key + "_" + "_".join( str( i ) for i in index ) + ".pdf" ) )
+        # figures are closed whether they were saved or not so that they are not kept alive by pyplot
+        for value in res.values():
+            if hasattr( value, "savefig" ):
+                plt.close( value )
+        self.done[ index ] = True
+
+    def completed( self ):
+        return int( np.count_nonzero( self.done[ ... ] ) )
+
+
+def open_sweep( path, chunks="auto" ):
+    import xarray as xr
+
+    # cells that are not finished yet are NaN and have done == False
+    return xr.open_zarr( path, chunks=chunks, mask_and_scale=False )
+
+
+def convert_pickle( pickle_path, path=None, chunks=64 ):
+    # writes a pickled xarray.DataArray of an older sweep (mse.pkl) as a chunked Zarr store next to it, once
+    import pickle
+
+    path = path if path is not None else os.path.splitext( pickle_path )[ 0 ] + ".zarr"
+    if not os.path.exists( path ):
+        with open( pickle_path, "rb" ) as f:
+            data = pickle.load( f )
+        name = data.name if data.name is not None else "MSE"
+        data.to_dataset( name=name ).chunk( { d: chunks for d in data.dims } ).to_zarr( path + ".tmp", mode="w",
+                                                                                          consolidated=True )
+        os.replace( path + ".tmp", path )
+
+    return path
+
+
+def load_sweep( path, variable=None, chunks="auto" ):
+    # one metric of a sweep as a lazy, dask-backed xarray.DataArray; reductions, rolling means and slices are computed
+    # chunk by chunk.  Pickled sweeps are converted to Zarr the first time they are opened
+    if path.endswith( ".pkl" ):
+        path = convert_pickle( path )
+    dataset = open_sweep( path, chunks=chunks )
+    if variable is None:
+        variables = [ v for v in dataset.data_vars if v != "done" ]
+        if len( variables ) != 1:
+            raise ValueError( f"Choose one of the variables {variables} of {path}" )
+        variable = variables[ 0 ]
+
+    return dataset[ variable ]
+
+
+def sweep_minimum( data ):
+    # value and coordinates of the minimum of a (lazy) DataArray, ignoring NaN cells, without loading it whole
+    index = { d: int( i ) for d, i in data.fillna( np.inf ).argmin( ... ).items() }
+    cell = data.isel( index ).compute()
+
+    return float( cell ), { d: cell[ d ].item() for d in data.dims }
@@ -0,0 +1,140 @@
+import numpy as np
+
+
+# Sparse history of a matrix changing over time, such as the weights or the memristor resistances of a learned
+# connection: mPES only updates the devices whose pre neuron spiked while the error was large, so instead of the full
+# post x pre matrix every sample only the entries that changed are kept, as (sample, row, column, new value) events in
+# compact typed arrays, together with a full keyframe every keyframe_every samples.
+# Any sample can be rebuilt from the keyframe before it and the events in between; the history can also be indexed
+# like the dense (samples, rows, columns) probe data it replaces.
+
+class WeightHistory:
+    def __init__( self, shape, keyframe_every=1000, dtype=np.float64 ):
+        self.shape = tuple( shape )
+        self.keyframe_every = keyframe_every
+        self.dtype = np.dtype( dtype )
+        self.index_dtype = np.uint16 if max( self.shape ) <= np.iinfo( np.uint16 ).max else np.uint32
+        self.n = 0
+        self.current = None
+        self.keyframes = { }
+        self._events = [ ]
+        self._arrays = None
+
+    def record( self, frames ):
+        # frames: the (samples, rows, columns) data of a probe, following the samples recorded so far
+        frames = np.asarray( frames, dtype=self.dtype ).reshape( (-1,) + self.shape )
+        if frames.shape[ 0 ] == 0:
+            return
+        for k in range( -self.n % self.keyframe_every, frames.shape[ 0 ], self.keyframe_every ):
+            self.keyframes[ self.n + k ] = frames[ k ].copy()
+
+        previous = np.concatenate( ([ self.current if self.current is not None else frames[ 0 ] ], frames[ :-1 ]) )
+        k, rows, cols = np.nonzero( frames != previous )
+        self._events.append( ((self.n + k).astype( np.uint32 ), rows.astype( self.index_dtype ),
+                              cols.astype( self.index_dtype ), frames[ k, rows, cols ]) )
+        self._arrays = None
+        self.current = frames[ -1 ].copy()
+        self.n += frames.shape[ 0 ]
+
+    def events( self ):
+        # all the events as (samples, rows, columns, values) arrays, sorted by sample
+        if self._arrays is None:
+            self._arrays = tuple( np.concatenate( [ e[ i ] for e in self._events ] ) if self._events else
+                                  np.zeros( 0, dtype=dtype )
+                                  for i, dtype in enumerate( [ np.uint32, self.index_dtype, self.index_dtype,
+                                                               self.dtype ] ) )
+            self._events = [ self._arrays ]
+
+        return self._arrays
+
+    def _apply( self, frame, start, stop ):
+        # applies the events of the samples in (start, stop]
+        samples, rows, cols, values = self.events()
+        lo, hi = np.searchsorted( samples, [ start, stop ], side="right" )
+        if hi > lo:
+            # only the last change of every entry counts
+            flat = rows[ lo:hi ].astype( np.int64 ) * self.shape[ 1 ] + cols[ lo:hi ]
+            _, last = np.unique( flat[ ::-1 ], return_index=True )
+            last = hi - 1 - last
+            frame[ rows[ last ], cols[ last ] ] = values[ last ]
+
+        return frame
+
+    def at( self, sample ):
+        # the matrix at the given sample (negative samples count from the end)
+        if sample < 0:
+            sample += self.n
+        if not 0 <= sample < self.n:
+            raise IndexError( f"Sample {sample} out of the {self.n} recorded" )
+        keyframe = sample - sample % self.keyframe_every
+
+        return self._apply( self.keyframes[ keyframe ].copy(), keyframe, sample )
+
+    def replay( self, start=0, stop=None, step=1 ):
+        # steps through the history, yielding the matrix of every step-th sample in [start, stop)
+        stop = self.n if stop is None else min( stop, self.n )
+        if start >= stop:
+            return
+        frame = self.at( start )
+        yield frame.copy()
+        for sample in range( start + step, stop, step ):
+            frame = self._apply( frame, sample - step, sample )
+            yield frame.copy()
+
+    def dense( self, start=0, stop=None, step=1 ):
+        frames = list( self.replay( start, stop, step ) )
+
+        return np.array( frames ) if frames else np.zeros( (0,) + self.shape, dtype=self.dtype )
+
+    def __len__( self ):
+        return self.n
+
+    def __getitem__( self, key ):
+        # the same results as indexing the dense data, only integers and slices are supported on the first axis
+        first, rest = (key[ 0 ], key[ 1: ]) if isinstance( key, tuple ) else (key, ())
+        if first is Ellipsis:
+            first, rest = slice( None ), (Ellipsis,) + rest
+        if isinstance( first, slice ):
+            frames = self.dense( *first.indices( self.n ) )
+
+            return frames[ (slice( None ),) + rest ]
+
+        return self.at( int( first ) )[ rest ]
+
+    def __array__( self, dtype=None ):
+        return self.dense() if dtype is None else self.dense().astype( dtype )
+
+    def nbytes( self ):
+        return sum( a.nbytes for a in self.events() ) + sum( f.nbytes for f in self.keyframes.values() )
+
+    def state( self ):
+        # arrays from which load_state rebuilds the history
+        samples, rows, cols, values = self.events()
+        keyframes = sorted( self.keyframes )
+
+        return dict( shape=np.array( self.shape ), counters=np.array( [ self.n, self.keyframe_every ] ),
+                     samples=samples, rows=rows, cols=cols, values=values,
+                     keyframe_samples=np.array( keyframes, dtype=np.int64 ),
+                     keyframes=np.array( [ self.keyframes[ s ] for s in keyframes ], dtype=self.dtype ).reshape(
+                             (-1,) + self.shape ) )
+
+    def load_state( self, state ):
+        self.shape = tuple( int( s ) for s in state[ "shape" ] )
+        self.n, self.keyframe_every = (int( v ) for v in state[ "counters" ])
+        self.dtype = np.dtype( state[ "values" ].dtype )
+        self.index_dtype = state[ "rows" ].dtype
+        self._arrays = tuple( np.array( state[ k ] ) for k in [ "samples", "rows", "cols", "values" ] )
+        self._events = [ self._arrays ]
+        self.keyframes = { int( s ): np.array( f ) for s, f in zip( state[ "keyframe_samples" ], state[ "keyframes" ] ) }
+        self.current = self.at( -1 ) if self.n > 0 else None
+
+    def save( self, path ):
+        np.savez( path, **self.state() )
+
+    @classmethod
+    def load( cls, path ):
+        state = np.load( path )
+        history = cls( state[ "shape" ] )
+        history.load_state( state )
+
+        return history
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.stats import kendalltau, pearsonr, spearmanr
+
+sys.path.append( os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "experiments" ) )
+from correlation_metrics import correlation_metrics
+
+rng = np.random.RandomState( 0 )
+dimensions = 3
+
+
+def reference( y_true, y_pred ):
+    return [ [ f( y_true[ :, d ], y_pred[ :, d ] )[ 0 ] for d in range( dimensions ) ]
+             for f in [ pearsonr, spearmanr, kendalltau ] ]
+
+
+def best_time( function, repeats=3 ):
+    times = [ ]
+    for _ in range( repeats ):
+        start = time.time()
+        result = function()
+        times.append( time.time() - start )
+
+    return min( times ), result
+
+
+for n, decimals in [ (2, None), (100, None), (5000, 1), (5000, 0) ]:
+    y_true = rng.randn( n, dimensions )
+    y_pred = y_true + rng.randn( n, dimensions )
+    if decimals is not None:
+        # ties in both series
+        y_true, y_pred = np.round( y_true, decimals ), np.round( y_pred, decimals )
+    metrics = correlation_metrics( y_true, y_pred )
+    offline = reference( y_true, y_pred )
+    print( f"{n} samples, ties: {decimals is not None}" )
+    print( "MSE matches?", np.allclose( metrics[ "mse" ], np.mean( (y_true - y_pred)**2, axis=0 ) ) )
+    print( "Pearson, Spearman and Kendall match?",
+           [ np.allclose( metrics[ name ], values ) for name, values in
+             zip( [ "pearson", "spearman", "kendall" ], offline ) ] )
+
+n = 100000
+y_true = rng.randn( n, dimensions )
+y_pred = y_true + rng.randn( n, dimensions )
+
+engine_time, metrics = best_time( lambda: correlation_metrics( y_true, y_pred ) )
+scipy_time, offline = best_time( lambda: reference( y_true, y_pred ) )
+print( f"\nAll metrics of {n} samples in {engine_time:.3f} s, scipy.stats for every dimension in {scipy_time:.3f} s" )
+print( "Engine matches scipy.stats?", [ np.allclose( metrics[ name ], values ) for name, values in
+                                        zip( [ "pearson", "spearman", "kendall" ], offline ) ] )
+
+subsampled = correlation_metrics( y_true, y_pred, subsample=2000, seed=0 )
+for name in [ "mse", "pearson", "spearman", "kendall" ]:
+    low, high = subsampled[ "intervals" ][ name ]
+    print( f"{name} within the interval of 2000 samples?",
+           np.all( (low <= metrics[ name ]) & (metrics[ name ] <= high) ) )
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import nengo
+import numpy as np
+
+sys.path.append( os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "experiments" ) )
+from function_learning import _front_end, experiment_setup
+
+sim_time = 1
+
+# the target precomputed from the whole input signal must be the one computed from the input at every step
+for experiment in range( 1, 6 ):
+    setup = experiment_setup( experiment )
+    targets = { }
+    for ground_truth in [ "node", "trace" ]:
+        with nengo.Network() as model:
+            _front_end( model, setup[ "neurons" ], setup[ "dimensions" ], setup[ "function_to_learn" ],
+                        convolve=experiment > 3, seed=0, sim_time=sim_time, ground_truth=ground_truth,
+                        target=setup[ "target" ] )
+            probe = nengo.Probe( model.ground_truth, synapse=None )
+        with nengo.Simulator( model, progress_bar=False ) as sim:
+            sim.run( sim_time )
+        targets[ ground_truth ] = sim.data[ probe ]
+    print( setup[ "exp_string" ] )
+    print( "Target shapes:", { k: v.shape for k, v in targets.items() } )
+    print( "Trace and node targets are equal?", targets[ "trace" ].shape == targets[ "node" ].shape
+           and np.allclose( targets[ "trace" ], targets[ "node" ] ) )
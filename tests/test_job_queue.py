@@ -0,0 +1,64 @@
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append( os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "experiments" ) )
+import numpy as np
+
+from job_queue import JobQueue, gather_results, run_worker
+
+
+def square( job ):
+    time.sleep( 0.01 )
+    # the first attempt at job 7 kills its worker without any chance of reporting back
+    if job[ "x" ] == 7 and not os.path.exists( job[ "crashed" ] ):
+        open( job[ "crashed" ], "w" ).close()
+        os._exit( 1 )
+    return job[ "x" ]**2
+
+
+def statistics( job ):
+    # the job of the second parameter and first seed always fails, like an mPES.py run that crashes
+    if job[ "k" ] == 1 and job[ "seed" ] == 0:
+        raise RuntimeError( "mPES.py returned 1" )
+    return [ job[ "k" ] + job[ "seed" ], 10 * job[ "k" ] ]
+
+
+def worker( path ):
+    queue = JobQueue( path, heartbeat_timeout=1 )
+    run_worker( queue, square, heartbeat_interval=0.1, poll=True, poll_interval=0.2 )
+
+
+if __name__ == "__main__":
+    directory = tempfile.mkdtemp()
+    path = os.path.join( directory, "queue.sqlite" )
+    queue = JobQueue( path, heartbeat_timeout=1 )
+    queue.enqueue( [ { "x": x, "crashed": os.path.join( directory, "crashed" ) } for x in range( 50 ) ] )
+
+    workers = [ multiprocessing.Process( target=worker, args=(path,) ) for _ in range( 4 ) ]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    # the crashed worker leaves its job running, the others pick it up once its heartbeat times out
+    print( "Queue status:", queue.counts() )
+
+    results = queue.results()
+    print( "Every job completed exactly once?",
+           sorted( job[ "x" ] for job, _ in results ) == list( range( 50 ) ) )
+    print( "Results are correct?", all( result == job[ "x" ]**2 for job, result in results ) )
+
+    # aggregating a search in which one job failed, as parameter_search_mPES.py --role aggregate does
+    path = os.path.join( directory, "search.sqlite" )
+    queue = JobQueue( path, max_attempts=1 )
+    queue.enqueue( [ { "k": k, "seed": seed } for k in range( 3 ) for seed in range( 2 ) ] )
+    run_worker( queue, statistics )
+    print( "Queue status:", queue.counts() )
+    results = gather_results( queue, (3, 2, 2), lambda job: (job[ "k" ], job[ "seed" ]) )
+    print( "Failed iteration left as NaN?", np.isnan( results[ 1, 0 ] ).all() and
+           np.count_nonzero( np.isnan( results ) ) == 2 )
+    print( "Iterations for each parameter:", np.sum( ~np.isnan( results[ ..., 0 ] ), axis=1 ) )
+    print( "Averages over the completed iterations?",
+           np.allclose( np.nanmean( results, axis=1 ), [ [ 0.5, 0 ], [ 2, 10 ], [ 2.5, 20 ] ] ) )
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+# mPES.py as run by parameter_search_mPES.py and averaging_mPES.py, with and without the weight history, in one and in
+# several discretised steps
+experiments = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "experiments" )
+
+for options in [ [ ], [ "-o", "memory" ], [ "--weight_history" ], [ "-o", "memory", "--weight_history" ] ]:
+    with tempfile.TemporaryDirectory() as directory:
+        result = subprocess.run( [ sys.executable, "mPES.py", "--verbosity", "1", "-S", "4", "-N", "10", "-D", "1",
+                                   "-b", "nengo_core", "-s", "0", "-pd", directory + "/" ] + options,
+                                 cwd=experiments, capture_output=True, universal_newlines=True )
+    print( "mPES.py", " ".join( options ) )
+    print( "Finished without errors?", result.returncode == 0 )
+    if result.returncode != 0:
+        print( result.stderr )
+    else:
+        # MSE, Pearson, Spearman, Kendall, MSE-to-rho
+        print( "Printed the statistics?", len( result.stdout.split( "\n" ) ) > 5 )
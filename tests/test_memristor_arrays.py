@@ -0,0 +1,92 @@
+import copy
+import os
+import sys
+from functools import partial
+
+import numpy as np
+from memristor_learning.MemristorModels import BidirectionalPowerlawMemristor, MemristorAnouk, \
+    MemristorAnoukBidirectional, OnedirectionalPowerlawMemristor
+from memristor_learning.Networks import MemristorComplementary, MemristorPlusMinus
+
+sys.path.append( os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "experiments" ) )
+from memristor_arrays import *
+
+# the memristor_learning device equivalent to every array, built with the same noise-free parameters
+devices = {
+        MemristorAnoukArray                 : lambda m: MemristorAnouk( r_0=m.r_0[ 0, 0 ], r_1=m.r_1[ 0, 0 ],
+                                                                        a=m.a[ 0, 0 ], b=m.b[ 0, 0 ] ),
+        OnedirectionalPowerlawMemristorArray: lambda m: OnedirectionalPowerlawMemristor( r_0=m.r_0[ 0, 0 ],
+                                                                                         r_1=m.r_1[ 0, 0 ],
+                                                                                         a=m.a[ 0, 0 ] ),
+        MemristorAnoukBidirectionalArray    : lambda m: MemristorAnoukBidirectional( r_0=m.r_0[ 0, 0 ],
+                                                                                     r_1=m.r_1[ 0, 0 ],
+                                                                                     r_3=m.r_3[ 0, 0 ],
+                                                                                     a=m.a[ 0, 0 ], b=m.b[ 0, 0 ],
+                                                                                     c=m.c[ 0, 0 ], d=m.d[ 0, 0 ] ),
+        BidirectionalPowerlawMemristorArray : lambda m: BidirectionalPowerlawMemristor( r_0=m.r_0[ 0, 0 ],
+                                                                                        r_1=m.r_1[ 0, 0 ],
+                                                                                        r_3=m.r_3[ 0, 0 ],
+                                                                                        a=m.a[ 0, 0 ], c=m.c[ 0, 0 ] )
+        }
+
+
+# one pulse of a memristor_learning device, as in tests/reverse_bias_exploration.ipynb
+def pulse_device( device, R, V, r_0, r_max ):
+    R = min( max( R, r_0 ), r_max )
+    n = device.compute_pulse_number( R, V )
+
+    return device.compute_resistance( n + 1, V )
+
+
+def update_reference( pos, neg, device, direction, complementary, base_voltage=1e-1 ):
+    pos_R = copy.deepcopy( pos.resistance )
+    neg_R = copy.deepcopy( neg.resistance )
+    for i, j in np.ndindex( direction.shape ):
+        if direction[ i, j ] == 0:
+            continue
+        up, down = (pos, neg) if direction[ i, j ] > 0 else (neg, pos)
+        up_R, down_R = (pos_R, neg_R) if direction[ i, j ] > 0 else (neg_R, pos_R)
+        up_R[ i, j ] = pulse_device( device, up_R[ i, j ], base_voltage, up.r_0[ i, j ], up.r_1[ i, j ] )
+        if complementary:
+            down_R[ i, j ] = pulse_device( device, down_R[ i, j ], -base_voltage, down.r_0[ i, j ],
+                                           down.r_3[ i, j ] )
+    return pos_R, neg_R
+
+
+shape = (10, 12)
+rng = np.random.RandomState( 0 )
+for pair, model, complementary in [
+        (MemristorPlusMinusArray, MemristorAnoukArray, False),
+        (MemristorPlusMinusArray, OnedirectionalPowerlawMemristorArray, False),
+        (MemristorPlusMinusArray, MemristorAnoukBidirectionalArray, False),
+        (MemristorComplementaryArray, MemristorAnoukBidirectionalArray, True),
+        (MemristorComplementaryArray, BidirectionalPowerlawMemristorArray, True) ]:
+    memristors = pair( shape, model=model, seed=0 )
+    device = devices[ model ]( memristors.pos )
+    equal = True
+    for step in range( 50 ):
+        direction = rng.randint( -1, 2, shape )
+        pos_R, neg_R = update_reference( memristors.pos, memristors.neg, device, direction, complementary )
+        memristors.update( direction )
+        equal &= np.allclose( pos_R, memristors.pos.resistance, rtol=1e-12 ) \
+                 and np.allclose( neg_R, memristors.neg.resistance, rtol=1e-12 )
+    print( f"{pair.__name__}({model.__name__}): vectorised and memristor_learning are equal?", equal )
+
+# the memristor_model factories of the parameter_search_m*.py drivers, as seen by MemristorArrayController
+for factory, pair, model in [
+        (partial( BidirectionalPowerlawMemristor, a=-0.5, c=-0.001, r_0=1e2, r_1=2.5e8 ),
+         MemristorSingleArray, BidirectionalPowerlawMemristorArray),
+        (partial( MemristorPlusMinus, model=partial( OnedirectionalPowerlawMemristor, a=-0.5, r_0=1e2, r_1=2.5e8 ) ),
+         MemristorPlusMinusArray, OnedirectionalPowerlawMemristorArray),
+        (partial( MemristorComplementary, model=partial( BidirectionalPowerlawMemristor, a=-0.5, c=-0.001, r_0=1e2,
+                                                         r_1=2.5e8 ) ),
+         MemristorComplementaryArray, BidirectionalPowerlawMemristorArray) ]:
+    controller = MemristorArrayController( factory, in_size=shape[ 1 ], out_size=shape[ 0 ], seed=0 )
+    memristors = controller.memristors
+    devices = [ memristors.device ] if pair is MemristorSingleArray else [ memristors.pos, memristors.neg ]
+    print( f"{factory.func.__name__}: {pair.__name__} of {model.__name__} with the same parameters?",
+           type( memristors ) is pair and all( type( d ) is model and np.all( d.a == -0.5 ) and np.all( d.r_0 == 1e2 )
+                                               for d in devices ) )
+    output = controller( 0.0, np.concatenate( (np.full( shape[ 1 ], 1000.0 ), np.ones( shape[ 0 ] )) ) )
+    print( "Crossbar output and weights updated?", output.shape == (shape[ 0 ],)
+           and not np.allclose( controller.weights, controller.gain * pair( shape, model=model, seed=0 ).weights() ) )
@@ -0,0 +1,49 @@
+import os
+import sys
+
+import nengo
+import numpy as np
+from scipy.stats import kendalltau, pearsonr, spearmanr
+
+sys.path.append( os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "experiments" ) )
+from online_metrics import OnlineMetrics
+
+function_to_learn = lambda x: x**2
+dimensions = 2
+learn_time = 1
+sample_every = 0.002
+
+with nengo.Network( seed=0 ) as model:
+    inp = nengo.Node( lambda t: [ np.sin( 2 * np.pi * t ), np.cos( 3 * t ) ] )
+    pre = nengo.Ensemble( 50, dimensions=dimensions )
+    post = nengo.Ensemble( 50, dimensions=dimensions )
+    nengo.Connection( inp, pre )
+    nengo.Connection( pre, post, function=function_to_learn )
+    pre_probe = nengo.Probe( pre, synapse=0.01, sample_every=sample_every )
+    post_probe = nengo.Probe( post, synapse=0.01, sample_every=sample_every )
+
+    # a reservoir smaller than the test phase, and one holding all of it
+    sketched = OnlineMetrics( function_to_learn, dimensions, learn_time, sample_every=sample_every,
+                              reservoir_size=200, seed=0 )
+    exact = OnlineMetrics( function_to_learn, dimensions, learn_time, sample_every=sample_every, seed=0 )
+    for metrics in [ sketched, exact ]:
+        node = nengo.Node( metrics.step, size_in=2 * dimensions, size_out=0 )
+        nengo.Connection( pre, node[ :dimensions ], synapse=0.01 )
+        nengo.Connection( post, node[ dimensions: ], synapse=0.01 )
+
+with nengo.Simulator( model ) as sim:
+    sim.run( 2 )
+
+y_true = function_to_learn( sim.data[ pre_probe ][ int( learn_time / sample_every ): ] )
+y_pred = sim.data[ post_probe ][ int( learn_time / sample_every ): ]
+mse = np.mean( (y_true - y_pred)**2, axis=0 )
+offline = [ [ f( y_true[ :, d ], y_pred[ :, d ] )[ 0 ] for d in range( dimensions ) ]
+            for f in [ pearsonr, spearmanr, kendalltau ] ]
+
+print( "Samples seen:", exact.n, "of", len( y_true ) )
+print( "MSE matches?", np.allclose( exact.mse(), mse ), np.allclose( sketched.mse(), mse ) )
+print( "Pearson matches?", np.allclose( sketched.pearson(), offline[ 0 ] ) )
+print( "Spearman and Kendall match with a large enough reservoir?",
+       np.allclose( exact.correlations()[ 1: ], offline[ 1: ] ) )
+print( "Sketched Spearman and Kendall error:",
+       np.abs( np.array( sketched.correlations()[ 1: ] ) - np.array( offline[ 1: ] ) ).max() )
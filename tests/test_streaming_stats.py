@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.append( os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "experiments" ) )
+from streaming_stats import StreamingStatistics, append_row, read_rows
+
+rng = np.random.RandomState( 0 )
+errors = rng.rand( 10, 20 )
+
+statistics = StreamingStatistics()
+for e in errors:
+    statistics.update( e )
+print( "Running mean and std equal to NumPy?", np.allclose( statistics.mean, errors.mean( axis=0 ) )
+       and np.allclose( statistics.std(), errors.std( axis=0 ) ) )
+
+with tempfile.TemporaryDirectory() as directory:
+    path = os.path.join( directory, "errors.csv" )
+    for i in range( 5 ):
+        append_row( path, i, errors[ i ] )
+    # a write interrupted in the middle of the sixth row
+    with open( path, "a" ) as f:
+        f.write( "5.000000000000000000e+00,1.2" )
+    rows = read_rows( path )
+    print( "Complete rows read back after an interrupted write?", sorted( rows ) == list( range( 5 ) )
+           and all( np.allclose( rows[ i ], errors[ i ] ) for i in rows ) )
+    # resuming appends after the complete rows
+    for i in range( 5, 10 ):
+        append_row( path, i, errors[ i ] )
+    rows = read_rows( path )
+    print( "All rows read back after resuming?", sorted( rows ) == list( range( 10 ) )
+           and all( np.allclose( rows[ i ], errors[ i ] ) for i in rows ) )
+    # a row with fewer values than the others
+    with open( path, "a" ) as f:
+        f.write( "1.000000000000000000e+01,0.5\n" )
+    print( "Short row dropped?", sorted( read_rows( path ) ) == list( range( 10 ) ) )
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import nengo
+import nengo_dl
+import numpy as np
+
+sys.path.append( os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), "..", "experiments" ) )
+from probe_store import clear_probes
+from weight_history import WeightHistory
+
+sim_time = 0.3
+chunks = 3
+
+
+def build():
+    with nengo.Network( seed=0 ) as model:
+        inp = nengo.Node( lambda t: np.sin( 5 * t ) )
+        pre = nengo.Ensemble( 20, dimensions=1 )
+        post = nengo.Ensemble( 10, dimensions=1 )
+        error = nengo.Node( size_in=1 )
+        nengo.Connection( inp, pre )
+        conn = nengo.Connection( pre, post, function=lambda x: 0, learning_rule_type=nengo.PES( 1e-3 ) )
+        nengo.Connection( post, error )
+        nengo.Connection( pre, error, transform=-1 )
+        nengo.Connection( error, conn.learning_rule )
+        weight_probe = nengo.Probe( conn, "weights", sample_every=0.001 )
+
+    return model, weight_probe
+
+
+for backend, simulator in [ ("nengo_core", lambda model: nengo.Simulator( model, optimize=False, progress_bar=False )),
+                            ("nengo_dl", lambda model: nengo_dl.Simulator( model, seed=0, progress_bar=False )) ]:
+    model, weight_probe = build()
+    with simulator( model ) as sim:
+        sim.run( sim_time )
+        uninterrupted = np.array( sim.data[ weight_probe ] )
+
+    # the chunk loop of mPES.py --weight_history, with chunks of the same length
+    model, weight_probe = build()
+    history = WeightHistory( uninterrupted.shape[ 1: ] )
+    with simulator( model ) as sim:
+        for _ in range( chunks ):
+            sim.run( sim_time / chunks )
+            history.record( sim.data[ weight_probe ] )
+            clear_probes( sim, [ weight_probe ] )
+
+    print( backend )
+    print( "Samples recorded:", len( history ), "of", len( uninterrupted ) )
+    print( "History matches the uninterrupted run?", np.allclose( history.dense(), uninterrupted ) )